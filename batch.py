@@ -0,0 +1,150 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+
+# screenrulerzoom - Batch rendering of rulers onto screenshots
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Dessine une règle et des mesures sur chaque image d'un dossier, sans
+# fenêtre. / Draws a ruler and measurements onto every image of a folder,
+# without a window.
+#
+#   screenrulerzoom --batch INPUT OUTPUT [--unit cm] [--orientation vertical]
+#                   [--dpi 96] [--marks 120,340,610] [--jobs 4]
+#
+# An optional INPUT/<image>.json sidecar overrides the options for one image:
+#   {"unit": "cm", "orientation": "vertical", "dpi": 110, "marks": [120, 340]}
+# marks are pixel positions along the ruler; the distance between each pair
+# of consecutive marks and from the first mark are written in the unit.
+#
+# Images are processed as a stream by a process pool: each worker holds one
+# image at a time and only file names and statuses go through the pool.
+
+from argparse import ArgumentParser
+from multiprocessing import Pool
+from os import environ, listdir, makedirs, path
+import json
+import sys
+
+from model import RulerModel, UNIT_NAMES
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+# Couleurs par défaut de Ruler. / Default colors of Ruler.
+COLORS = [(230, 230, 250), (0, 30, 120), (220, 0, 0)]
+# Épaisseur de la règle, voir Ruler.sY. / Thickness of the ruler, see Ruler.sY.
+RULER_WIDTH = 70
+
+def startWorker():
+    # Chaque processus a son application Qt sans affichage, nécessaire aux
+    # polices, et son cache de textes. / Each process has its own Qt
+    # application without a display, needed for fonts, and its text cache.
+    environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtGui import QGuiApplication
+    from screenrulerzoom import LabelCache
+    global app, labels
+    app = QGuiApplication(["screenrulerzoom-batch"])
+    labels = LabelCache()
+
+def imageOptions(filename, defaults):
+    options = dict(defaults)
+    sidecar = path.splitext(filename)[0] + ".json"
+    if path.exists(sidecar):
+        with open(sidecar) as data:
+            options.update(json.load(data))
+    return options
+
+def renderImage(job):
+    # Renvoie (nom, None) ou (nom, message d'erreur). / Returns (name, None)
+    # or (name, error message).
+    from PyQt5.QtCore import QLineF, QPointF, Qt
+    from PyQt5.QtGui import QColor, QImage, QPainter, QPen
+    from screenrulerzoom import drawGraduation
+    source, target, defaults = job
+    try:
+        options = imageOptions(source, defaults)
+        image = QImage(source)
+        if image.isNull():
+            return source, "cannot read the image"
+        image = image.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+        oH = 1 if options["orientation"] == "vertical" else 0
+        model = RulerModel(UNIT_NAMES.index(options["unit"]), oH, options["dpi"], options["dpi"], image.height() if oH else image.width())
+        text, background, highlight = [QColor(*color) for color in COLORS]
+        qp = QPainter()
+        qp.begin(image)
+        metrics = qp.fontMetrics()
+        width, height = (RULER_WIDTH, image.height()) if oH else (image.width(), RULER_WIDTH)
+        qp.fillRect(0, 0, width, height, background)
+        qp.setPen(text)
+        # Le tracé de Ruler.drawScale. / The drawing of Ruler.drawScale.
+        drawGraduation(qp, labels, model.ticks(), oH, width, height, "1" if options["unit"] == "px" else options["unit"], "%s %ddpi" % (options["unit"], options["dpi"]))
+        # Lignes des marques et distances entre marques successives. / Mark
+        # lines and distances between consecutive marks.
+        marks = sorted(options["marks"])
+        qp.setPen(QPen(highlight, 1, Qt.DashLine))
+        for mark in marks:
+            if oH:
+                qp.drawLine(QLineF(0, mark, image.width(), mark))
+            else:
+                qp.drawLine(QLineF(mark, 0, mark, image.height()))
+        qp.setPen(highlight)
+        for previous, mark in zip(marks, marks[1:]):
+            label = "%s %s (%s)" % (model.format(model.toUnits(mark - previous)), options["unit"], model.format(model.toUnits(mark - marks[0])))
+            middle = (previous + mark) / 2
+            if oH:
+                qp.drawText(QPointF(RULER_WIDTH + 4, middle + metrics.height() / 2), label)
+            else:
+                qp.drawText(QPointF(middle - metrics.horizontalAdvance(label) / 2, RULER_WIDTH + metrics.height() + 2), label)
+        qp.end()
+        if not image.save(target):
+            return source, "cannot write %s" % target
+    except Exception as error:
+        return source, str(error)
+    return source, None
+
+def jobs(inputDir, outputDir, defaults):
+    # Générateur : les noms sont produits au fur et à mesure. / Generator:
+    # names are produced as they are needed.
+    for name in sorted(listdir(inputDir)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            yield path.join(inputDir, name), path.join(outputDir, path.splitext(name)[0] + ".png"), defaults
+
+def main(args=None):
+    parser = ArgumentParser(prog="screenrulerzoom --batch", description="Draw rulers and measurements onto screenshots")
+    parser.add_argument("input", help="folder of screenshots")
+    parser.add_argument("output", help="folder of annotated images")
+    parser.add_argument("--unit", choices=UNIT_NAMES, default="px")
+    parser.add_argument("--orientation", choices=["horizontal", "vertical"], default="horizontal", help="horizontal measures along x, vertical along y")
+    parser.add_argument("--dpi", type=int, default=96)
+    parser.add_argument("--marks", default="", help="comma separated pixel positions along the ruler")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args(args)
+    makedirs(args.output, exist_ok=True)
+    defaults = {
+        "unit": args.unit,
+        "orientation": args.orientation,
+        "dpi": args.dpi,
+        "marks": [int(mark) for mark in args.marks.split(",") if mark.strip()],
+    }
+    failures = done = 0
+    with Pool(args.jobs, initializer=startWorker, maxtasksperchild=256) as pool:
+        for source, error in pool.imap_unordered(renderImage, jobs(args.input, args.output, defaults), chunksize=4):
+            done += 1
+            if error is not None:
+                failures += 1
+                print("%s: %s" % (source, error), file=sys.stderr)
+    print("%d image(s), %d failure(s)" % (done, failures))
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Micro-benchmark of the screen capture backends (see capture.py): capture
+# latency of the area under the ruler for each ruler size and orientation.
+#
+# Runs under Xvfb without a real display:
+#   python3 benchmarks/capture.py --xvfb
+# or on the current display:
+#   python3 benchmarks/capture.py
+
+from argparse import ArgumentParser
+from os import environ, path
+from shutil import which
+from subprocess import Popen
+from time import perf_counter, sleep
+import json
+import sys
+
+sys.path.insert(0, path.dirname(path.dirname(path.realpath(__file__))))
+
+# Taille de base de la règle, voir Ruler.sX et Ruler.sY. / Base size of the
+# ruler, see Ruler.sX and Ruler.sY.
+RULER_LENGTH, RULER_WIDTH = 600, 70
+
+def startXvfb(display, geometry):
+    if which("Xvfb") is None:
+        sys.exit("Xvfb is not installed")
+    server = Popen(["Xvfb", display, "-screen", "0", geometry, "-nolisten", "tcp"])
+    sleep(1)
+    environ["DISPLAY"] = display
+    environ["QT_QPA_PLATFORM"] = "xcb"
+    return server
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def main():
+    parser = ArgumentParser(description="Capture backend latency benchmark")
+    parser.add_argument("--xvfb", action="store_true", help="start a private Xvfb server")
+    parser.add_argument("--display", default=":99", help="Xvfb display (default :99)")
+    parser.add_argument("--geometry", default="3840x2160x24", help="Xvfb screen (default 3840x2160x24)")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+    server = startXvfb(args.display, args.geometry) if args.xvfb else None
+    try:
+        from PyQt5.QtCore import QRect
+        from PyQt5.QtWidgets import QApplication
+        from capture import BACKENDS, CaptureError
+        app = QApplication([])
+        screen = app.primaryScreen()
+        results = []
+        for backend in BACKENDS:
+            try:
+                capture = backend(screen, 0)
+            except (CaptureError, OSError) as error:
+                print("%s: unavailable (%s)" % (backend.name, error), file=sys.stderr)
+                continue
+            cases = []
+            for size in range(4):
+                for oH in range(2):
+                    length = RULER_LENGTH * (size + 1)
+                    cases.append([str(size), oH, QRect(0, 0, RULER_WIDTH, length) if oH else QRect(0, 0, length, RULER_WIDTH)])
+            # Règle x4 à cheval sur le coin bas droit de l'écran, plus large
+            # que lui si l'écran est petit. / x4 ruler straddling the bottom
+            # right corner of the screen, wider than it on a small screen.
+            geometry = screen.geometry()
+            cases.append(["edge", 0, QRect(geometry.right() - RULER_LENGTH // 2, geometry.bottom() - RULER_WIDTH // 2, max(RULER_LENGTH * 4, geometry.width() + RULER_LENGTH), RULER_WIDTH)])
+            for size, oH, rect in cases:
+                image = capture.grab(rect)
+                if image.size() / image.devicePixelRatio() != rect.size():
+                    print("%s: %s capture of %dx%d has size %dx%d" % (backend.name, size, rect.width(), rect.height(), image.width(), image.height()), file=sys.stderr)
+                timings = []
+                for _ in range(args.iterations):
+                    started = perf_counter()
+                    capture.grab(rect)
+                    timings.append((perf_counter() - started) * 1000)
+                results.append({
+                    "backend": backend.name,
+                    "size": size,
+                    "oH": oH,
+                    "width": rect.width(),
+                    "height": rect.height(),
+                    "mean_ms": sum(timings) / len(timings),
+                    "p50_ms": percentile(timings, 0.5),
+                    "p95_ms": percentile(timings, 0.95),
+                })
+            capture.close()
+        if args.json:
+            print(json.dumps(results, indent=1))
+        else:
+            print("%-8s %4s %3s %11s %9s %9s %9s" % ("backend", "size", "oH", "area", "mean ms", "p50 ms", "p95 ms"))
+            for item in results:
+                print("%-8s %4s %3d %11s %9.3f %9.3f %9.3f" % (item["backend"], item["size"], item["oH"], "%dx%d" % (item["width"], item["height"]), item["mean_ms"], item["p50_ms"], item["p95_ms"]))
+    finally:
+        if server is not None:
+            server.terminate()
+
+if __name__ == "__main__":
+    main()
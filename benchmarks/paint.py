@@ -0,0 +1,184 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Headless benchmark of the Ruler widget: paintEvent for every unit,
+# orientation, ruler size and zoom, with and without the cursor line and
+# marks, the cursor move to paint latency and saveBackground.
+#
+#   python3 benchmarks/paint.py --output baseline.json
+#   python3 benchmarks/paint.py --compare baseline.json
+#
+# The comparison exits with status 1 when a case is slower than the baseline
+# by more than --threshold percent.
+
+from argparse import ArgumentParser
+from itertools import product
+from os import environ, path
+from tempfile import mkdtemp
+from time import perf_counter
+import json
+import platform
+import sys
+
+environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, path.dirname(path.dirname(path.realpath(__file__))))
+
+from PyQt5.QtCore import QPoint, QSettings
+from PyQt5.QtGui import QColor, QImage, QPainter
+from PyQt5.QtWidgets import QApplication
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def summary(timings):
+    return {
+        "runs": len(timings),
+        "mean_ms": sum(timings) / len(timings),
+        "p50_ms": percentile(timings, 0.5),
+        "p95_ms": percentile(timings, 0.95),
+        "max_ms": max(timings),
+    }
+
+def timed(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = perf_counter()
+        function()
+        timings.append((perf_counter() - started) * 1000)
+    return summary(timings)
+
+def makeRuler():
+    # Paramètres isolés pour ne pas lire ni écrire ceux de l'utilisateur. /
+    # Isolated settings so the user's ones are neither read nor written.
+    QSettings.setPath(QSettings.NativeFormat, QSettings.UserScope, mkdtemp())
+    app = QApplication([])
+    import screenrulerzoom
+    screenrulerzoom.app = app
+    ruler = screenrulerzoom.Ruler()
+    ruler.move(0, 0)
+    ruler.show()
+    app.processEvents()
+    return app, ruler
+
+def fakeBackground(size):
+    # Capture synthétique : la plateforme offscreen ne renvoie rien. /
+    # Synthetic capture: the offscreen platform returns nothing.
+    image = QImage(size, QImage.Format_RGB32)
+    qp = QPainter()
+    qp.begin(image)
+    for x in range(0, image.width(), 8):
+        qp.fillRect(x, 0, 8, image.height(), QColor.fromHsv(x % 360, 200, 200))
+    qp.end()
+    return image
+
+def resetCaches(ruler):
+    ruler.scaleLayers.clear()
+    ruler.zoomFrame = None
+    ruler.labels.clear()
+
+def configure(ruler, unitIndex, oH, rulerSize, zoom, overlay, marks=2):
+    ruler.changeMode(zoom)
+    ruler.changeUnitMeasure(unitIndex)
+    ruler.changeRulerSize(rulerSize)
+    ruler.changeOrientation(oH)
+    ruler.pix = fakeBackground(ruler.size()) if zoom else None
+    ruler.marks.clear()
+    ruler.cursor = None
+    if overlay:
+        middle = QPoint(ruler.width() // 2, ruler.height() // 2)
+        ruler.cursor = ruler.mapToGlobal(middle)
+        # Marques régulièrement espacées sur la règle. / Marks evenly spaced
+        # along the ruler.
+        for i in range(1, marks + 1):
+            point = ruler.mapToParent(QPoint(ruler.width() * i // (marks + 1), middle.y()) if not oH else QPoint(middle.x(), ruler.height() * i // (marks + 1)))
+            ruler.marks.add(point.x(), point.y())
+
+def run(repeat):
+    app, ruler = makeRuler()
+    results = {}
+    for unitIndex, oH, rulerSize, zoom, overlay in product(range(len(ruler.unitDefs)), range(2), range(4), range(4), range(2)):
+        configure(ruler, unitIndex, oH, rulerSize, zoom, overlay)
+        image = QImage(ruler.size(), QImage.Format_ARGB32_Premultiplied)
+        name = "paint/unit%d/oH%d/size%d/zoom%d/%s" % (unitIndex, oH, rulerSize, zoom, "overlay" if overlay else "plain")
+
+        def cold():
+            resetCaches(ruler)
+            ruler.render(image)
+        results[name + "/cold"] = timed(cold, max(1, repeat // 4))
+        results[name + "/warm"] = timed(lambda: ruler.render(image), repeat)
+    # Latence d'un mouvement du curseur jusqu'à la fin de l'affichage. /
+    # Latency from a cursor move to the end of the paint.
+    # Avec une session de 500 marques, seules les voisines du curseur sont
+    # redessinées. / With a session of 500 marks, only the neighbours of the
+    # cursor are repainted.
+    for oH, marks in product(range(2), [0, 500]):
+        configure(ruler, 0, oH, 3, 0, marks, marks)
+        ruler.cursor = None
+        app.processEvents()
+        span = ruler.height() if oH else ruler.width()
+        step = [0]
+
+        def move():
+            step[0] = (step[0] + 7) % span
+            pos = ruler.mapToGlobal(QPoint(ruler.width() // 2, step[0]) if oH else QPoint(step[0], ruler.height() // 2))
+            ruler.cursor = pos
+            ruler.cursorMove.emit(pos)
+            app.processEvents()
+        painted = ruler.paintedPixelTotal
+        result = results["cursor/oH%d" % oH + ("/marks%d" % marks if marks else "")] = timed(move, repeat)
+        # Pixels redessinés par mouvement, pour mesurer le gain des zones
+        # partielles. / Pixels repainted per move, to measure the saving of
+        # partial areas.
+        result["pixels_per_move"] = (ruler.paintedPixelTotal - painted) / repeat
+        result["ruler_pixels"] = ruler.width() * ruler.height()
+    for rulerSize in range(4):
+        configure(ruler, 0, 0, rulerSize, 1, 0)
+        results["saveBackground/size%d" % rulerSize] = timed(ruler.saveBackground, max(1, repeat // 4))
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": environ["QT_QPA_PLATFORM"],
+            "repeat": repeat,
+            "numpy": sys.modules["model"].loadNumpy() is not None,
+        },
+        "results": results,
+    }
+
+def compare(current, baseline, threshold):
+    # Régression : p50 plus lent que la référence de plus de threshold %. /
+    # Regression: p50 slower than the baseline by more than threshold %.
+    regressions = []
+    for name, result in sorted(current["results"].items()):
+        reference = baseline["results"].get(name)
+        if reference is None or reference["p50_ms"] <= 0:
+            continue
+        change = (result["p50_ms"] - reference["p50_ms"]) / reference["p50_ms"] * 100
+        flag = "REGRESSION" if change > threshold else ""
+        print("%-48s %9.3f %9.3f %+8.1f%% %s" % (name, reference["p50_ms"], result["p50_ms"], change, flag))
+        if flag:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = ArgumentParser(description="Headless Ruler paint benchmark")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per case (default 20)")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare with a stored JSON baseline")
+    parser.add_argument("--threshold", type=float, default=10, help="regression threshold in percent (default 10)")
+    args = parser.parse_args()
+    current = run(args.repeat)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(current, output, indent=1, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(current, json.load(baseline), args.threshold)
+        if regressions:
+            print("%d regression(s) above %g%%" % (len(regressions), args.threshold))
+            sys.exit(1)
+    elif not args.output:
+        json.dump(current, sys.stdout, indent=1, sort_keys=True)
+
+if __name__ == "__main__":
+    main()
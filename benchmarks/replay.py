@@ -0,0 +1,134 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Replays an input trace (see inputtrace.py) into an offscreen Ruler and
+# reports the paints it caused. Record a trace with:
+#
+#   screenrulerzoom --record sweep.srzt
+#
+# then replay it as fast as possible, or with its recorded timing:
+#
+#   python3 benchmarks/replay.py sweep.srzt
+#   python3 benchmarks/replay.py sweep.srzt --speed real --output report.json
+#
+# With --budget, the replay exits with status 1 when the p95 paint duration
+# is above the budget in milliseconds.
+
+from argparse import ArgumentParser
+from collections import Counter
+from os import devnull, environ, path
+from time import perf_counter, sleep, time
+import json
+import sys
+
+environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, path.dirname(path.dirname(path.realpath(__file__))))
+
+from PyQt5.QtCore import QEvent, QPoint, QPointF, Qt
+from PyQt5.QtGui import QKeyEvent, QMouseEvent
+
+from inputtrace import CURSOR, DOUBLE_CLICK, DRAG_END, DRAG_MOVE, DRAG_START, KEY_PRESS, KEY_RELEASE, KEY_REPEAT, KIND_NAMES, TraceError, TraceReader
+from paint import fakeBackground, makeRuler, summary
+
+def dispatch(app, ruler, kind, a, b):
+    if kind == CURSOR:
+        ruler.cursorPolled(QPoint(a, b), time())
+    elif kind in (KEY_PRESS, KEY_REPEAT, KEY_RELEASE):
+        # Échap fermerait la règle. / Escape would close the ruler.
+        if a != Qt.Key_Escape:
+            app.sendEvent(ruler, QKeyEvent(QEvent.KeyRelease if kind == KEY_RELEASE else QEvent.KeyPress, a, Qt.KeyboardModifiers(b), "", kind == KEY_REPEAT))
+    elif kind in (DRAG_START, DOUBLE_CLICK):
+        eventType = QEvent.MouseButtonPress if kind == DRAG_START else QEvent.MouseButtonDblClick
+        app.sendEvent(ruler, QMouseEvent(eventType, QPointF(a, b), Qt.LeftButton, Qt.LeftButton, Qt.NoModifier))
+    elif kind == DRAG_MOVE:
+        pos = QPoint(a, b)
+        app.sendEvent(ruler, QMouseEvent(QEvent.MouseMove, QPointF(ruler.mapFromGlobal(pos)), QPointF(pos), Qt.NoButton, Qt.LeftButton, Qt.NoModifier))
+    elif kind == DRAG_END:
+        app.sendEvent(ruler, QMouseEvent(QEvent.MouseButtonRelease, QPointF(0, 0), Qt.LeftButton, Qt.NoButton, Qt.NoModifier))
+
+def drain(app, seconds):
+    # Laisse tourner les minuteries (déplacements clavier, capture différée).
+    # / Let the timers run (keyboard nudges, deferred capture).
+    end = perf_counter() + seconds
+    while perf_counter() < end:
+        app.processEvents()
+        sleep(0.001)
+
+def replay(filename, realTime):
+    reader = TraceReader(filename)
+    app, ruler = makeRuler()
+    import screenrulerzoom
+    # Seule la trace déplace le curseur et les captures sont synthétiques,
+    # pendant tout le rejeu. / Only the trace moves the cursor and captures
+    # are synthetic, for the whole replay.
+    ruler.replaying = True
+    ruler.mouseTimer.stop()
+    ruler.captureScreen = lambda rect: fakeBackground(rect.size())
+    unitIndex, oH, rulerSize, zoom, x, y = reader.header
+    ruler.changeMode(zoom)
+    ruler.changeUnitMeasure(unitIndex)
+    ruler.changeRulerSize(rulerSize)
+    ruler.changeOrientation(oH)
+    ruler.move(x, y)
+    ruler.pix = fakeBackground(ruler.size()) if zoom else None
+    drain(app, 0.05)
+    # Compteurs remis à zéro après la mise en place. / Counters reset after
+    # the setup.
+    ruler.profiler = screenrulerzoom.Profiler(devnull, 1 << 16)
+    kinds = Counter()
+    duration = 0
+    started = perf_counter()
+    for at, kind, a, b in reader:
+        if realTime:
+            while perf_counter() - started < at:
+                app.processEvents()
+                sleep(min(0.001, max(0, at - (perf_counter() - started))))
+        dispatch(app, ruler, kind, a, b)
+        app.processEvents()
+        kinds[KIND_NAMES[kind] if kind < len(KIND_NAMES) else str(kind)] += 1
+        duration = at
+    drain(app, 0.3)
+    elapsed = perf_counter() - started
+    profiler = ruler.profiler
+    return {
+        "trace": filename,
+        "speed": "real" if realTime else "max",
+        "records": sum(kinds.values()),
+        "kinds": dict(kinds),
+        "trace_s": duration,
+        "wall_s": elapsed,
+        # Demandés par invalidate, regroupés par Qt ou effectués, et
+        # mouvements du curseur sans affichage. / Requested by invalidate,
+        # coalesced by Qt or done, and cursor moves without a paint.
+        "paints_requested": profiler.requestCount,
+        "paints_issued": profiler.paintCount,
+        "paints_coalesced": max(0, profiler.requestCount - profiler.paintCount),
+        "paints_skipped": profiler.skipCount,
+        "paint_total_ms": profiler.paintTotal,
+        "paint": summary(list(profiler.paints)) if profiler.paints else None,
+        "latency": summary(list(profiler.latencies)) if profiler.latencies else None,
+    }
+
+def main():
+    parser = ArgumentParser(description="Replay an input trace into an offscreen Ruler")
+    parser.add_argument("trace", help="trace recorded with screenrulerzoom --record")
+    parser.add_argument("--speed", choices=["max", "real"], default="max", help="replay as fast as possible (default) or with the recorded timing")
+    parser.add_argument("--output", help="write the report to this JSON file")
+    parser.add_argument("--budget", type=float, help="fail when the p95 paint duration is above this many ms")
+    args = parser.parse_args()
+    try:
+        report = replay(args.trace, args.speed == "real")
+    except (OSError, TraceError) as error:
+        sys.exit(str(error))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=1, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=1, sort_keys=True)
+        print()
+    if args.budget is not None and report["paint"] is not None and report["paint"]["p95_ms"] > args.budget:
+        print("p95 paint %.3f ms above the %g ms budget" % (report["paint"]["p95_ms"], args.budget))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+
+# screenrulerzoom - Screen capture backends
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Chaque backend capture un rectangle de l'écran (coordonnées globales
+# logiques de Qt) et renvoie une QImage. / Each backend captures a rectangle
+# of the screen (Qt global logical coordinates) and returns a QImage.
+#
+# The returned image may share memory with the backend and is only valid
+# until the next grab() on the same backend; copy() it to keep it longer.
+# A backend instance must only be used from the thread that created it, and
+# only backends with threadSafe set may be created outside the GUI thread.
+
+import ctypes
+from ctypes.util import find_library
+from os import environ
+from threading import Lock
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QImage, QPainter
+try:
+    from PyQt5 import sip
+except ImportError:
+    import sip
+
+CAPTURE_ENV = "SCREENRULERZOOM_CAPTURE"
+
+class CaptureError(Exception):
+    pass
+
+class QScreenCapture:
+    # Capture par QScreen.grabWindow, disponible partout. / Capture through
+    # QScreen.grabWindow, available everywhere.
+    name = "qscreen"
+    # grabWindow crée une QPixmap : fil de l'interface seulement. /
+    # grabWindow builds a QPixmap: GUI thread only.
+    threadSafe = False
+
+    def __init__(self, screen, winId=0):
+        self.screen = screen
+        self.winId = winId
+
+    def grab(self, rect):
+        return self.screen.grabWindow(self.winId, rect.x(), rect.y(), rect.width(), rect.height()).toImage()
+
+    def close(self):
+        pass
+
+class XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [
+        ("shmseg", ctypes.c_ulong),
+        ("shmid", ctypes.c_int),
+        ("shmaddr", ctypes.c_void_p),
+        ("readOnly", ctypes.c_int),
+    ]
+
+class XImage(ctypes.Structure):
+    # Début de la structure XImage de Xlib, seuls ces champs sont lus. /
+    # Head of the Xlib XImage structure, only these fields are read.
+    _fields_ = [
+        ("width", ctypes.c_int),
+        ("height", ctypes.c_int),
+        ("xoffset", ctypes.c_int),
+        ("format", ctypes.c_int),
+        ("data", ctypes.c_void_p),
+        ("byte_order", ctypes.c_int),
+        ("bitmap_unit", ctypes.c_int),
+        ("bitmap_bit_order", ctypes.c_int),
+        ("bitmap_pad", ctypes.c_int),
+        ("depth", ctypes.c_int),
+        ("bytes_per_line", ctypes.c_int),
+        ("bits_per_pixel", ctypes.c_int),
+    ]
+
+class XErrorEvent(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_int),
+        ("display", ctypes.c_void_p),
+        ("resourceid", ctypes.c_ulong),
+        ("serial", ctypes.c_ulong),
+        ("error_code", ctypes.c_ubyte),
+        ("request_code", ctypes.c_ubyte),
+        ("minor_code", ctypes.c_ubyte),
+    ]
+
+X_ERROR_HANDLER = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(XErrorEvent))
+
+# Le gestionnaire d'erreurs de Xlib est global au processus. / The Xlib error
+# handler is global to the process.
+xErrorLock = Lock()
+
+class XShmCapture:
+    # Capture X11 MIT-SHM : le serveur écrit directement dans un segment de
+    # mémoire partagée réutilisé, enveloppé dans une QImage sans copie. /
+    # X11 MIT-SHM capture: the server writes straight into a reused shared
+    # memory segment, wrapped in a QImage without copying.
+    name = "xshm"
+    # Sa propre connexion X11, indépendante de Qt. / Its own X11 connection,
+    # independent of Qt.
+    threadSafe = True
+    ZPixmap = 2
+    IPC_PRIVATE, IPC_CREAT, IPC_RMID = 0, 0o1000, 0
+
+    def __init__(self, screen, winId=0):
+        names = [find_library(name) for name in ("X11", "Xext", "c")]
+        if None in names or not environ.get("DISPLAY"):
+            raise CaptureError("MIT-SHM needs libX11, libXext and an X11 display")
+        self.xlib, self.xext, self.libc = [ctypes.CDLL(name) for name in names]
+        self.xlib.XOpenDisplay.restype = ctypes.c_void_p
+        self.xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        self.xlib.XDefaultScreen.argtypes = [ctypes.c_void_p]
+        self.xlib.XDefaultRootWindow.restype = ctypes.c_ulong
+        self.xlib.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        self.xlib.XDefaultVisual.restype = ctypes.c_void_p
+        self.xlib.XDefaultVisual.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        self.xlib.XDefaultDepth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        self.xlib.XDisplayWidth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        self.xlib.XDisplayHeight.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        self.xlib.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        self.xlib.XDestroyImage.argtypes = [ctypes.POINTER(XImage)]
+        self.xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        self.xlib.XSetErrorHandler.restype = ctypes.c_void_p
+        self.xlib.XSetErrorHandler.argtypes = [ctypes.c_void_p]
+        self.xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+        self.xext.XShmCreateImage.restype = ctypes.POINTER(XImage)
+        self.xext.XShmCreateImage.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo), ctypes.c_uint, ctypes.c_uint]
+        self.xext.XShmAttach.argtypes = [ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo)]
+        self.xext.XShmDetach.argtypes = [ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo)]
+        self.xext.XShmGetImage.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(XImage), ctypes.c_int, ctypes.c_int, ctypes.c_ulong]
+        self.libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+        self.libc.shmat.restype = ctypes.c_void_p
+        self.libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+        self.libc.shmdt.argtypes = [ctypes.c_void_p]
+        self.libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+        self.display = self.xlib.XOpenDisplay(None)
+        if not self.display:
+            raise CaptureError("cannot open the X11 display")
+        if not self.xext.XShmQueryExtension(self.display):
+            self.xlib.XCloseDisplay(self.display)
+            raise CaptureError("the X11 server has no MIT-SHM extension")
+        number = self.xlib.XDefaultScreen(self.display)
+        self.root = self.xlib.XDefaultRootWindow(self.display)
+        self.visual = self.xlib.XDefaultVisual(self.display, number)
+        self.depth = self.xlib.XDefaultDepth(self.display, number)
+        # XShmGetImage échoue si la zone dépasse la fenêtre racine. /
+        # XShmGetImage fails when the area goes past the root window.
+        self.rootWidth = self.xlib.XDisplayWidth(self.display, number)
+        self.rootHeight = self.xlib.XDisplayHeight(self.display, number)
+        self.screen = screen
+        self.ratio = screen.devicePixelRatio()
+        self.segment = None
+        self.image = None
+        self.errors = []
+        self.previousHandler = None
+        self.errorHandler = X_ERROR_HANDLER(self.xError)
+        self.errorHandlerAddress = ctypes.cast(self.errorHandler, ctypes.c_void_p).value
+
+    def xError(self, display, event):
+        # Le gestionnaire par défaut de Xlib appelle exit(). / The default
+        # Xlib handler calls exit().
+        if display == self.display:
+            self.errors.append(event.contents.error_code)
+            return 0
+        if self.previousHandler:
+            return X_ERROR_HANDLER(self.previousHandler)(display, event)
+        return 0
+
+    def checked(self, what, function, *args, sync=True):
+        # Appelle une fonction Xlib, synchronisée si elle n'attend pas de
+        # réponse ; les erreurs X deviennent des CaptureError. / Calls an Xlib
+        # function, synced when it does not wait for a reply; X errors become
+        # CaptureError.
+        with xErrorLock:
+            self.errors = []
+            self.previousHandler = self.xlib.XSetErrorHandler(self.errorHandlerAddress)
+            try:
+                result = function(*args)
+                if sync:
+                    self.xlib.XSync(self.display, 0)
+            finally:
+                self.xlib.XSetErrorHandler(self.previousHandler)
+                self.previousHandler = None
+        if self.errors or not result:
+            raise CaptureError("%s failed%s" % (what, " (X error %d)" % self.errors[0] if self.errors else ""))
+        return result
+
+    def allocate(self, width, height):
+        # Le segment n'est recréé que si la taille change. / The segment is
+        # only created again when the size changes.
+        self.release()
+        segment = XShmSegmentInfo()
+        image = self.xext.XShmCreateImage(self.display, self.visual, self.depth, self.ZPixmap, None, ctypes.byref(segment), width, height)
+        if not image:
+            raise CaptureError("XShmCreateImage failed")
+        if image.contents.bits_per_pixel != 32:
+            self.xlib.XDestroyImage(image)
+            raise CaptureError("only 32 bits per pixel visuals are supported")
+        segment.shmid = self.libc.shmget(self.IPC_PRIVATE, image.contents.bytes_per_line * height, self.IPC_CREAT | 0o600)
+        if segment.shmid < 0:
+            self.xlib.XDestroyImage(image)
+            raise CaptureError("shmget failed")
+        segment.shmaddr = self.libc.shmat(segment.shmid, None, 0)
+        if segment.shmaddr in (None, ctypes.c_void_p(-1).value):
+            self.libc.shmctl(segment.shmid, self.IPC_RMID, None)
+            self.xlib.XDestroyImage(image)
+            raise CaptureError("shmat failed")
+        image.contents.data = segment.shmaddr
+        segment.readOnly = 0
+        try:
+            # Échoue sans espace IPC partagé avec le serveur (ssh -X,
+            # conteneurs). / Fails without an IPC namespace shared with the
+            # server (ssh -X, containers).
+            self.checked("XShmAttach", self.xext.XShmAttach, self.display, ctypes.byref(segment))
+        except CaptureError:
+            image.contents.data = None
+            self.xlib.XDestroyImage(image)
+            self.libc.shmdt(segment.shmaddr)
+            self.libc.shmctl(segment.shmid, self.IPC_RMID, None)
+            raise
+        # Marqué pour suppression une fois attaché par le serveur : libéré au
+        # dernier détachement. / Marked for removal once the server has
+        # attached it: freed at the last detach.
+        self.libc.shmctl(segment.shmid, self.IPC_RMID, None)
+        self.segment, self.image = segment, image
+
+    def grab(self, rect):
+        x, y = round(rect.x() * self.ratio), round(rect.y() * self.ratio)
+        width, height = round(rect.width() * self.ratio), round(rect.height() * self.ratio)
+        # Seule la partie sur l'écran est lue ; le reste est noir, comme avec
+        # QScreenCapture. / Only the part on the screen is read; the rest is
+        # black, as with QScreenCapture.
+        left, top = max(x, 0), max(y, 0)
+        right, bottom = min(x + width, self.rootWidth), min(y + height, self.rootHeight)
+        if right <= left or bottom <= top:
+            image = QImage(width, height, QImage.Format_RGB32)
+            image.fill(Qt.black)
+            image.setDevicePixelRatio(self.ratio)
+            return image
+        if self.image is None or (self.image.contents.width, self.image.contents.height) != (right - left, bottom - top):
+            self.allocate(right - left, bottom - top)
+        self.checked("XShmGetImage", self.xext.XShmGetImage, self.display, self.root, self.image, left, top, ctypes.c_ulong(-1).value, sync=False)
+        image = QImage(sip.voidptr(self.segment.shmaddr), right - left, bottom - top, self.image.contents.bytes_per_line, QImage.Format_RGB32)
+        if (right - left, bottom - top) != (width, height):
+            padded = QImage(width, height, QImage.Format_RGB32)
+            padded.fill(Qt.black)
+            qp = QPainter()
+            qp.begin(padded)
+            qp.drawImage(left - x, top - y, image)
+            qp.end()
+            image = padded
+        image.setDevicePixelRatio(self.ratio)
+        return image
+
+    def release(self):
+        if self.image is None:
+            return
+        self.xext.XShmDetach(self.display, ctypes.byref(self.segment))
+        # Les données appartiennent au segment, pas à Xlib. / The data belongs
+        # to the segment, not to Xlib.
+        self.image.contents.data = None
+        self.xlib.XDestroyImage(self.image)
+        self.libc.shmdt(self.segment.shmaddr)
+        self.segment, self.image = None, None
+
+    def close(self):
+        if self.display:
+            self.release()
+            self.xlib.XCloseDisplay(self.display)
+            self.display = None
+
+BACKENDS = [XShmCapture, QScreenCapture]
+
+def captureBackend(name, screen, winId=0):
+    # name: "auto", "qscreen" or "xshm"; the SCREENRULERZOOM_CAPTURE
+    # environment variable takes precedence. "auto" and an unavailable backend
+    # fall back to the next one of BACKENDS, ending with QScreenCapture.
+    name = environ.get(CAPTURE_ENV, name or "auto").lower()
+    candidates = [backend for backend in BACKENDS if name in ("auto", backend.name)] + [QScreenCapture]
+    for backend in candidates:
+        try:
+            return backend(screen, winId)
+        except (CaptureError, OSError):
+            continue
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+# screenrulerzoom - Input traces
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Enregistrement binaire des entrées de la règle (curseur, touches,
+# déplacements) pour les rejouer, voir benchmarks/replay.py. / Binary record
+# of the ruler inputs (cursor, keys, drags) to replay them, see
+# benchmarks/replay.py.
+#
+# Format, little endian:
+#   header  "SRZT", version, unitIndex, oH, rulerSize, zoom (bytes),
+#           ruler x, y (int32)
+#   record  kind (byte), microseconds since the previous record (uint32),
+#           a, b (int32)
+# CURSOR and DRAG_MOVE carry global x, y; DRAG_START and DOUBLE_CLICK local
+# x, y; KEY_* the Qt key and modifiers.
+
+from struct import Struct
+from time import perf_counter
+
+MAGIC = b"SRZT"
+VERSION = 1
+HEADER = Struct("<4sBBBBBii")
+RECORD = Struct("<BIii")
+
+CURSOR, KEY_PRESS, KEY_REPEAT, KEY_RELEASE, DRAG_START, DRAG_MOVE, DRAG_END, DOUBLE_CLICK = range(1, 9)
+KIND_NAMES = ["", "cursor", "key press", "key repeat", "key release", "drag start", "drag move", "drag end", "double click"]
+
+class TraceError(Exception):
+    pass
+
+class TraceWriter:
+    # Les enregistrements sont gardés en mémoire par paquets puis écrits. /
+    # Records are kept in memory in batches then written.
+    def __init__(self, filename, unitIndex, oH, rulerSize, zoom, x, y, batch=256):
+        self.output = open(filename, "wb")
+        self.output.write(HEADER.pack(MAGIC, VERSION, unitIndex, oH, rulerSize, zoom, x, y))
+        self.batch = batch
+        self.pending = []
+        self.last = perf_counter()
+
+    def write(self, kind, a=0, b=0):
+        now = perf_counter()
+        delta = min(int((now - self.last) * 1000000), 0xFFFFFFFF)
+        self.last = now
+        self.pending.append(RECORD.pack(kind, delta, a, b))
+        if len(self.pending) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        self.output.write(b"".join(self.pending))
+        self.pending = []
+
+    def close(self):
+        if not self.output.closed:
+            self.flush()
+            self.output.close()
+
+class TraceReader:
+    # header: [unitIndex, oH, rulerSize, zoom, x, y]; les enregistrements
+    # sont lus à la demande : (secondes depuis le début, kind, a, b). /
+    # header: [unitIndex, oH, rulerSize, zoom, x, y]; records are read on
+    # demand: (seconds since the start, kind, a, b).
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, "rb") as data:
+            header = data.read(HEADER.size)
+        if len(header) != HEADER.size:
+            raise TraceError("%s: truncated header" % filename)
+        magic, version, *self.header = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise TraceError("%s: not a version %d input trace" % (filename, VERSION))
+
+    def __iter__(self):
+        elapsed = 0
+        with open(self.filename, "rb") as data:
+            data.seek(HEADER.size)
+            while True:
+                record = data.read(RECORD.size)
+                if len(record) < RECORD.size:
+                    return
+                kind, delta, a, b = RECORD.unpack(record)
+                elapsed += delta
+                yield elapsed / 1000000, kind, a, b
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+
+# screenrulerzoom - Ruler geometry without Qt
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Conversion d'unités, graduations et distances de la règle, utilisables sans
+# fenêtre ni Qt. / Unit conversion, ticks and distances of the ruler, usable
+# without a window or Qt.
+
+from array import array
+from bisect import bisect_left, bisect_right
+from os import path
+from time import time
+import csv
+import json
+
+# Abréviations des unités, dans l'ordre de Ruler.unitDefs. / Unit
+# abbreviations, in the order of Ruler.unitDefs.
+UNIT_NAMES = ["px", "pt", "in", "pc", "cm"]
+
+# [unités par graduation principale, subdivisions moyennes, petites] /
+# [units per major tick, mid, minor subdivisions]
+UNIT_TICKS = [
+    [50, 5, 25],
+    [1, 0, 4],
+    [1, 0, 4],
+    [1, 0, 4],
+    [1, 0, 2],
+]
+
+# Longueur des graduations principales, moyennes et petites. /
+# Length of the major, mid and minor ticks.
+TICK_LENGTHS = (20, 15, 10)
+
+# NumPy est importé à la demande : son import coûte plus que le calcul des
+# graduations d'une règle courante. / NumPy is imported on demand: importing
+# it costs more than computing the ticks of a usual ruler.
+numpy = None
+NUMPY_MIN_TICKS = 4096
+
+def loadNumpy():
+    global numpy
+    if numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+    return numpy or None
+
+# Force minimale d'un bord : moyenne des écarts RVB entre deux pixels voisins.
+# / Minimum strength of an edge: mean RGB difference between two neighbours.
+EDGE_MIN_STRENGTH = 24
+
+def unitScales(dpiX, dpiY):
+    # Pixels par unité [X, Y] dans l'ordre de UNIT_NAMES. / Pixels per unit
+    # [X, Y] in the order of UNIT_NAMES.
+    return [
+        [1, 1],
+        [dpiX/6*2, dpiY/6*2],
+        [dpiX, dpiY],
+        [dpiX/6, dpiY/6],
+        [dpiX/2.54, dpiY/2.54],
+    ]
+
+def tickLayout(span, step, mid=0, minor=0, labelStep=1, start=2):
+    # Calcule les graduations directement à partir du pas de l'unité, sans
+    # parcourir chaque pixel. / Compute the ticks directly from the unit step
+    # instead of testing every pixel.
+    # span: longueur de la règle en pixels / ruler length in pixels
+    # step: pixels entre deux graduations principales / pixels between majors
+    # mid, minor: subdivisions of a major step (0 for none)
+    # labelStep: value added to the label at each major tick
+    # Returns [(positions, length, labels)] for the major, mid and minor
+    # classes; labels is None except for the major class.
+    layout = []
+    for divisions, length in zip((1, mid, minor), TICK_LENGTHS):
+        if not divisions:
+            continue
+        spacing = step / divisions
+        # Une subdivision qui tombe sur une graduation d'une classe
+        # supérieure n'est pas redessinée. / A subdivision that falls on a
+        # tick of a higher class is not drawn again.
+        higher = [d for d in (1, mid)[:len(layout)] if d]
+        count = int(span / spacing) + 1
+        if count >= NUMPY_MIN_TICKS and loadNumpy() is not None:
+            index = numpy.arange(count + 1)
+            positions = numpy.floor(index * spacing + 0.5).astype(numpy.int32)
+            keep = (positions >= start) & (positions < span)
+            for d in higher:
+                keep &= (index * d) % divisions != 0
+            index, positions = index[keep], positions[keep]
+        else:
+            index = [j for j in range(count + 1) if start <= int(j * spacing + 0.5) < span and all((j * d) % divisions for d in higher)]
+            positions = array("i", (int(j * spacing + 0.5) for j in index))
+        layout.append((positions, length, [j * labelStep for j in index] if divisions == 1 else None))
+    return layout
+
+class RulerModel:
+    # État géométrique d'une règle : unité, orientation, DPI et longueur.
+    # scales et ticks remplacent unitScales et UNIT_TICKS pour des unités
+    # définies par l'utilisateur. / Geometric state of a ruler: unit,
+    # orientation, DPI and length. scales and ticks replace unitScales and
+    # UNIT_TICKS for user-defined units.
+    def __init__(self, unitIndex=0, oH=0, dpiX=96, dpiY=96, length=600, scales=None, ticks=None):
+        self.unitIndex = unitIndex
+        self.oH = oH
+        self.dpiX = dpiX
+        self.dpiY = dpiY
+        self.length = length
+        self.scales = scales if scales is not None else unitScales(dpiX, dpiY)
+        self.tickSpecs = ticks if ticks is not None else UNIT_TICKS
+
+    def scale(self):
+        # Pixels par unité le long de la règle. / Pixels per unit along the
+        # ruler.
+        return self.scales[self.unitIndex][self.oH]
+
+    def ticks(self):
+        units, mid, minor = self.tickSpecs[self.unitIndex]
+        return tickLayout(self.length, self.scale() * units, mid, minor, units)
+
+    def toUnits(self, pixels):
+        return pixels / self.scale()
+
+    def format(self, value):
+        # Les pixels restent entiers, les autres unités ont deux décimales. /
+        # Pixels stay integers, other units have two decimals.
+        return str(int(round(value))) if not self.unitIndex else "%.2f" % value
+
+class EdgeIndex:
+    # Positions triées des bords d'une capture le long de la règle et leur
+    # force. / Sorted positions of the edges of a capture along the ruler and
+    # their strength.
+    def __init__(self, positions=(), strengths=()):
+        self.positions = array("i", positions)
+        self.strengths = array("f", strengths)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def snap(self, position, radius):
+        # Bord le plus fort à moins de radius pixels, le plus proche en cas
+        # d'égalité ; sinon position. / Strongest edge within radius pixels,
+        # the nearest one on a tie; otherwise position.
+        first = bisect_left(self.positions, position - radius)
+        last = bisect_right(self.positions, position + radius)
+        if first == last:
+            return position
+        best = max(range(first, last), key=lambda i: (self.strengths[i], -abs(self.positions[i] - position)))
+        return self.positions[best]
+
+def edgeIndex(buffer, width, height, stride, oH=0, ratio=1, limit=256):
+    # Bords les plus marqués d'une image 32 bits par pixel (QImage RGB32),
+    # lue sans copie depuis buffer. / Strongest edges of a 32 bits per pixel
+    # image (QImage RGB32), read without copying from buffer.
+    # oH: 0 measures along x, 1 along y
+    # ratio: device pixel ratio, positions are returned in logical pixels
+    # limit: number of edges kept, the strongest ones
+    # Without NumPy, the index is empty and nothing snaps.
+    if loadNumpy() is None or width < 2 or height < 2:
+        return EdgeIndex()
+    pixels = numpy.frombuffer(buffer, numpy.uint8, stride * height).reshape(height, stride)[:, :width * 4]
+    pixels = pixels.reshape(height, width, 4)[..., :3]
+    # Écart entre voisins le long de l'axe, moyenné sur l'épaisseur de la
+    # règle : un bord d'élément d'interface la traverse. / Difference between
+    # neighbours along the axis, averaged over the thickness of the ruler: the
+    # boundary of a UI element crosses it.
+    axis = 0 if oH else 1
+    profile = numpy.abs(numpy.diff(pixels.astype(numpy.int16), axis=axis)).sum(axis=2).mean(axis=1 - axis) / 3
+    # Maxima locaux assez forts. / Strong enough local maxima.
+    padded = numpy.concatenate(([0], profile, [0]))
+    peaks = numpy.nonzero((profile >= padded[:-2]) & (profile > padded[2:]) & (profile >= EDGE_MIN_STRENGTH))[0]
+    if len(peaks) > limit:
+        peaks = peaks[numpy.argsort(profile[peaks])[-limit:]]
+        peaks.sort()
+    # Un bord entre i et i + 1 est placé sur i + 1, premier pixel de la
+    # nouvelle zone. / An edge between i and i + 1 is placed on i + 1, the
+    # first pixel of the new area.
+    return EdgeIndex(numpy.rint((peaks + 1) / ratio).astype(int).tolist(), profile[peaks].tolist())
+
+class MarkSession:
+    # Marques d'une session de mesure en coordonnées globales, triées le long
+    # de l'axe de la règle dans deux tableaux parallèles. / Marks of a
+    # measurement session in global coordinates, sorted along the axis of the
+    # ruler in two parallel arrays.
+    def __init__(self, oH=0):
+        self.oH = oH
+        self.xs = array("i")
+        self.ys = array("i")
+
+    def __len__(self):
+        return len(self.xs)
+
+    def axis(self):
+        return self.ys if self.oH else self.xs
+
+    def point(self, index):
+        return self.xs[index], self.ys[index]
+
+    def setAxis(self, oH):
+        # Un changement d'orientation retrie les marques. / A change of
+        # orientation sorts the marks again.
+        if oH != self.oH:
+            self.oH = oH
+            points = sorted(zip(self.xs, self.ys), key=lambda point: point[oH])
+            self.xs = array("i", [point[0] for point in points])
+            self.ys = array("i", [point[1] for point in points])
+
+    def add(self, x, y):
+        index = bisect_right(self.axis(), y if self.oH else x)
+        self.xs.insert(index, x)
+        self.ys.insert(index, y)
+        return index
+
+    def remove(self, index):
+        del self.xs[index]
+        del self.ys[index]
+
+    def clear(self):
+        del self.xs[:]
+        del self.ys[:]
+
+    def find(self, value, radius):
+        # Indice de la marque la plus proche de value à moins de radius, sinon
+        # None. / Index of the mark nearest to value within radius, otherwise
+        # None.
+        axis = self.axis()
+        candidates = range(bisect_left(axis, value - radius), bisect_right(axis, value + radius))
+        return min(candidates, key=lambda i: abs(axis[i] - value), default=None)
+
+    def span(self, start, end):
+        # Indices [first, last) des marques entre start et end compris. /
+        # Indices [first, last) of the marks between start and end included.
+        axis = self.axis()
+        return bisect_left(axis, start), bisect_right(axis, end)
+
+    def distances(self, index, model):
+        # Distance à la marque précédente et depuis la première, dans l'unité
+        # de model. / Distance to the previous mark and from the first one, in
+        # the unit of model.
+        axis = self.axis()
+        previous = model.toUnits(axis[index] - axis[index - 1]) if index else 0
+        return previous, model.toUnits(axis[index] - axis[0])
+
+class MarkExport:
+    # Journal des marques ajouté au fur et à mesure à un fichier CSV, JSON
+    # Lines (.jsonl) ou tableau JSON (.json). / Log of the marks appended as
+    # it goes to a CSV, JSON Lines (.jsonl) or JSON array (.json) file.
+    # Raises OSError when the file cannot be opened and ValueError when a
+    # .json file is not an array written by MarkExport.
+    FIELDS = ["time", "action", "x", "y", "position", "unit", "distance", "cumulative"]
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.format = "jsonl" if filename.lower().endswith(".jsonl") else "json" if filename.lower().endswith(".json") else "csv"
+        self.writer = None
+        if self.format == "json":
+            # Le tableau reste valide après chaque ligne : le "]" final est
+            # réécrit à la suite. / The array stays valid after each row: the
+            # final "]" is written again after it.
+            self.output = open(filename, "r+b" if path.exists(filename) and path.getsize(filename) else "w+b")
+            if self.output.seek(0, 2):
+                self.output.seek(-2, 2)
+                if self.output.read(2) != b"\n]":
+                    self.output.close()
+                    raise ValueError("%s is not a JSON array of marks" % filename)
+            else:
+                self.output.write(b"[\n]")
+            self.output.seek(-2, 2)
+        else:
+            self.output = open(filename, "a", newline="")
+            if self.format == "csv":
+                self.writer = csv.writer(self.output)
+                if not self.output.tell():
+                    self.writer.writerow(self.FIELDS)
+
+    def write(self, action, session=None, index=None, model=None, unit=""):
+        # action: "add", "remove" or "clear"; index is the mark in session.
+        row = [round(time(), 3), action, "", "", "", unit, "", ""]
+        if index is not None:
+            x, y = session.point(index)
+            distance, cumulative = session.distances(index, model)
+            row[2:] = [x, y, session.axis()[index], unit, model.format(distance), model.format(cumulative)]
+        if self.format == "json":
+            self.output.write(((",\n" if self.output.tell() > 1 else "\n") + json.dumps(dict(zip(self.FIELDS, row))) + "\n]").encode())
+            self.output.seek(-2, 2)
+        elif self.format == "jsonl":
+            self.output.write(json.dumps(dict(zip(self.FIELDS, row))) + "\n")
+        else:
+            self.writer.writerow(row)
+        # Chaque ligne est écrite aussitôt. / Each line is written at once.
+        self.output.flush()
+
+    def close(self):
+        self.output.close()
@@ -17,15 +17,24 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from collections import deque
+from collections import deque, OrderedDict
 from copy import deepcopy
 from functools import partial
 from gettext import bindtextdomain, gettext, textdomain
-from os import path
-from time import time
-from PyQt5.QtCore import pyqtSignal, QSettings, Qt, QTimer, QUrl
-from PyQt5.QtGui import QColor, QCursor, QDesktopServices, QIcon, QPainter, QPen, QPixmap
-from PyQt5.QtWidgets import QAction, QApplication, QColorDialog, QDialog, QGridLayout, QMainWindow, QMessageBox, QPushButton, QStyle, QLabel, QLayout, QMenu
+from math import ceil
+from os import environ, makedirs, path
+from sys import argv
+from time import perf_counter, time
+import json
+# Début du démarrage, pour --startup-profile. / Start of the startup, for
+# --startup-profile.
+startupPhases = [["start", perf_counter()]]
+from PyQt5.QtCore import pyqtSignal, QEvent, QLineF, QMutex, QMutexLocker, QPoint, QPointF, QRect, QRectF, QSettings, QSize, QStandardPaths, Qt, QThread, QTimer, QUrl
+from PyQt5.QtGui import QColor, QCursor, QDesktopServices, QFontMetrics, QIcon, QImage, QPainter, QPen, QPixmap, QStaticText, QTransform
+from PyQt5.QtWidgets import QAction, QApplication, QColorDialog, QDialog, QFileDialog, QGridLayout, QMainWindow, QMessageBox, QPushButton, QStyle, QLabel, QLayout, QMenu
+from inputtrace import CURSOR, DOUBLE_CLICK, DRAG_END, DRAG_MOVE, DRAG_START, KEY_PRESS, KEY_RELEASE, KEY_REPEAT, TraceWriter
+from model import MarkExport, MarkSession, RulerModel, UNIT_TICKS, edgeIndex, unitScales
+startupPhases.append(["imports", perf_counter()])
 
 PROJECT_NAME = "ScreenRulerZoom"
 PROJECT_VERSION = "1.0"
@@ -33,10 +42,229 @@ PROJECT_RELEASE_DATE = "2015-04-06"
 PROJECT_TEAM = "ElMoribond"
 PROJECT_EMAIL = "elmoribond@gmail.com"
 PROJECT_URL = "https://github.com/ElMoribond/screenrulerzoom"
+# "1" enregistre les mesures de performance, "hud" les affiche aussi. /
+# "1" records performance measurements, "hud" also displays them.
+PROFILE_ENV = "SCREENRULERZOOM_PROFILE"
 
-bindtextdomain(PROJECT_NAME.lower(), path.join(path.dirname(path.realpath(__file__)), "i18n"))
+PROJECT_DIR = path.dirname(path.realpath(__file__))
+
+bindtextdomain(PROJECT_NAME.lower(), path.join(PROJECT_DIR, "i18n"))
 textdomain(PROJECT_NAME.lower())
 
+# Pixmaps chargés une seule fois pour tout le processus. / Pixmaps loaded
+# once for the whole process.
+pixmaps = {}
+
+def resourcePixmap(name):
+    if name not in pixmaps:
+        pixmaps[name] = QPixmap(path.join(PROJECT_DIR, "png", "%s.png" % name))
+    return pixmaps[name]
+
+def startupMark(name):
+    startupPhases.append([name, perf_counter()])
+
+def startupReport():
+    # Durée de chaque phase jusqu'au premier affichage. / Duration of each
+    # phase up to the first paint.
+    lines = ["%-20s %8.1f ms" % (phase[0], (phase[1] - previous[1]) * 1000) for previous, phase in zip(startupPhases, startupPhases[1:])]
+    lines.append("%-20s %8.1f ms" % ("time to first paint", (startupPhases[-1][1] - startupPhases[0][1]) * 1000))
+    return "\n".join(lines)
+
+def drawLabel(qp, labels, x, y, text):
+    # Comme drawText, y est la ligne de base ; labels est un LabelCache. /
+    # Like drawText, y is the baseline; labels is a LabelCache.
+    staticText, rect, ascent = labels.get(text, qp.font(), qp.pen().color())
+    qp.drawStaticText(QPointF(x, y - ascent), staticText)
+
+def drawGraduation(qp, labels, ticks, oH, width, height, sample, header):
+    # Graduation d'une règle, utilisée par Ruler et batch.py. / Graduation of
+    # a ruler, used by Ruler and batch.py.
+    # ticks: RulerModel.ticks()
+    # sample: text whose size places the header ("1" or the unit abbreviation)
+    # header: text drawn at the start of the ruler
+    for positions, length, tickLabels in ticks:
+        # Un seul drawLines par classe de graduation, des deux côtés. /
+        # A single drawLines per tick class, on both sides.
+        if oH:
+            lines = [QLineF(0, i, length, i) for i in positions] + [QLineF(width, i, width - length - 1, i) for i in positions]
+        else:
+            lines = [QLineF(i, 0, i, length) for i in positions] + [QLineF(i, height, i, height - length - 1) for i in positions]
+        qp.drawLines(lines)
+        if tickLabels is None:
+            continue
+        for i, count in zip(positions, tickLabels):
+            cS= labels.get(str(count), qp.font(), qp.pen().color())[1]
+            if oH:
+                drawLabel(qp, labels, (width - cS.width()) / 2, i + cS.height() / 2, str(count))
+            else:
+                drawLabel(qp, labels, i - cS.width() / 2, height / 2 + cS.height() / 2, str(count))
+    # Dessinez des messages globaux au début de la règle. / Draw global messages at the start of the ruler.
+    cS= labels.get(sample, qp.font(), qp.pen().color())[1]
+    if oH:
+        drawLabel(qp, labels, (width - cS.width()) / 2, cS.height(), header)
+    else:
+        drawLabel(qp, labels, 3, height / 2 + cS.height() / 3, header)
+
+def drawPixelGrid(device, factor, ratio, color):
+    # Une ligne entre chaque pixel capturé d'une image agrandie. / A line
+    # between every captured pixel of a magnified image.
+    width, height = device.width(), device.height()
+    lines = [QLineF(x / ratio, 0, x / ratio, height / ratio) for x in range(factor, width, factor)]
+    lines += [QLineF(0, y / ratio, width / ratio, y / ratio) for y in range(factor, height, factor)]
+    color = QColor(color)
+    color.setAlpha(96)
+    qp = QPainter()
+    qp.begin(device)
+    qp.setPen(QPen(color, 0))
+    qp.drawLines(lines)
+    qp.end()
+
+def magnify(image, factor, grid, gridColor):
+    # Agrandissement au plus proche voisin d'une capture, grille comprise. /
+    # Nearest-neighbour magnification of a capture, grid included.
+    ratio = image.devicePixelRatio()
+    image = image.scaled(image.size() * factor, Qt.IgnoreAspectRatio, Qt.FastTransformation)
+    image.setDevicePixelRatio(ratio)
+    if grid and factor >= 4:
+        drawPixelGrid(image, factor, ratio, gridColor)
+    return image
+
+class LabelCache:
+    # Cache LRU borné des textes préparés (QStaticText) et de leurs
+    # dimensions, indexé par texte, police et couleur. / Bounded LRU cache of
+    # prepared texts (QStaticText) and their metrics, keyed by text, font and
+    # color.
+    def __init__(self, size=512):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text, font, color):
+        # Renvoie (QStaticText, rectangle englobant serré, ascent). /
+        # Returns (QStaticText, tight bounding rect, ascent).
+        key = (text, font.key(), QColor(color).rgba())
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry
+        self.misses += 1
+        metrics = QFontMetrics(font)
+        staticText = QStaticText(text)
+        staticText.setTextFormat(Qt.PlainText)
+        staticText.prepare(QTransform(), font)
+        entry = self.entries[key] = (staticText, metrics.tightBoundingRect(text), metrics.ascent())
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        self.entries.clear()
+
+class Profiler:
+    # Mesures de performance dans des tampons circulaires de taille fixe :
+    # durée de chaque affichage, délai entre un mouvement du curseur et la fin
+    # de l'affichage correspondant, coût des captures. / Performance
+    # measurements in fixed size ring buffers: duration of each paint, delay
+    # from a cursor move to the end of the matching paint, cost of captures.
+    def __init__(self, filename, size=512):
+        self.filename = filename
+        self.paints = deque(maxlen=size)
+        self.latencies = deque(maxlen=size)
+        self.captures = deque(maxlen=size)
+        # Pixels redessinés par seconde, une valeur par seconde. / Repainted
+        # pixels per second, one value per second.
+        self.pixelRates = deque(maxlen=size)
+        # Zoom direct : délai de la capture à l'image reçue par l'interface,
+        # images affichées par seconde, images remplacées avant affichage. /
+        # Live zoom: delay from the capture to the frame received by the GUI,
+        # frames displayed per second, frames replaced before being displayed.
+        self.liveLatencies = deque(maxlen=size)
+        self.liveRates = deque(maxlen=size)
+        self.liveFrameCount = 0
+        self.liveDropCount = 0
+        self.liveFramesPerSecond = 0
+        self.liveSecond = (None, 0)
+        self.captureCount = 0
+        self.inputAt = None
+        # Totaux sur toute la session : affichages demandés, effectués, leur
+        # durée, et mouvements du curseur sans rien à redessiner. / Totals
+        # over the whole session: paints requested, done, their duration, and
+        # cursor moves with nothing to repaint.
+        self.requestCount = 0
+        self.paintCount = 0
+        self.paintTotal = 0
+        self.skipCount = 0
+
+    def cursorMoved(self):
+        # Le premier mouvement non encore affiché fait foi. / The first move
+        # not yet painted counts.
+        if self.inputAt is None:
+            self.inputAt = perf_counter()
+
+    def painted(self, started):
+        ended = perf_counter()
+        self.paintCount += 1
+        self.paintTotal += (ended - started) * 1000
+        self.paints.append((ended - started) * 1000)
+        if self.inputAt is not None:
+            self.latencies.append((ended - self.inputAt) * 1000)
+            self.inputAt = None
+
+    def captured(self, started):
+        self.captureCount += 1
+        self.captures.append((perf_counter() - started) * 1000)
+
+    def liveFrame(self, started, dropped=0):
+        now = perf_counter()
+        self.liveLatencies.append((now - started) * 1000)
+        self.liveFrameCount += 1
+        self.liveDropCount = dropped
+        since, count = self.liveSecond
+        if since is None:
+            since = now
+        elif now - since >= 1:
+            self.liveFramesPerSecond = count / (now - since)
+            self.liveRates.append(self.liveFramesPerSecond)
+            since, count = now, 0
+        self.liveSecond = (since, count + 1)
+
+    @staticmethod
+    def stats(values):
+        # (p50, p95, max) en ms, None si vide. / (p50, p95, max) in ms, None
+        # if empty.
+        if not values:
+            return None
+        values = sorted(values)
+        return values[len(values) // 2], values[min(len(values) - 1, int(len(values) * 0.95))], values[-1]
+
+    def dump(self):
+        # Une ligne JSON par mesure puis un résumé. / One JSON line per
+        # measurement then a summary.
+        makedirs(path.dirname(self.filename) or ".", exist_ok=True)
+        with open(self.filename, "a") as output:
+            for kind, values in [["paint", self.paints], ["latency", self.latencies], ["capture", self.captures], ["live", self.liveLatencies]]:
+                for value in values:
+                    output.write(json.dumps({"kind": kind, "ms": round(value, 4)}) + "\n")
+            output.write(json.dumps({
+                "kind": "summary",
+                "time": time(),
+                "captureCount": self.captureCount,
+                "requestCount": self.requestCount,
+                "paintCount": self.paintCount,
+                "paintTotal": round(self.paintTotal, 4),
+                "skipCount": self.skipCount,
+                "paint": self.stats(self.paints),
+                "latency": self.stats(self.latencies),
+                "capture": self.stats(self.captures),
+                "pixelsPerSecond": self.stats(self.pixelRates),
+                "liveFrameCount": self.liveFrameCount,
+                "liveDropCount": self.liveDropCount,
+                "live": self.stats(self.liveLatencies),
+                "liveFramesPerSecond": self.stats(self.liveRates),
+            }) + "\n")
+
 class Ruler(QMainWindow):
     cursorMove= pyqtSignal(object)
 
@@ -48,7 +276,7 @@ class Ruler(QMainWindow):
 
                 def __init__(self):
                     super().__init__()
-                    self.setPixmap(QPixmap(path.join(path.dirname(path.realpath(__file__)), "png", "gplv3-127x51.png")))
+                    self.setPixmap(resourcePixmap("gplv3-127x51"))
 
                 def mousePressEvent(self, event):
                     if event.button() == Qt.LeftButton:
@@ -89,6 +317,8 @@ class Ruler(QMainWindow):
                 layout.setSizeConstraint(QLayout.SetFixedSize)
 
         # Init de Menu
+        # Construit une seule fois, mis à jour par refresh avant chaque
+        # ouverture. / Built once, updated by refresh before each opening.
         def __init__(self, parent):
             super().__init__(parent)
             self.parent = parent
@@ -102,60 +332,197 @@ class Ruler(QMainWindow):
             rulerSizeItem = QMenu(gettext("Ruler Size"), self)
             colorsItem = QMenu(gettext("Colors"), self)
             zoomItem = QMenu(gettext("Zoom"), self)
-            self.addAction(QAction(parent.orientation[1 if not parent.oH else 0], self, triggered=partial(parent.changeOrientation, 1 if not parent.oH else 0)))
-            menuDefs = [
-                [zoomItem, parent.zooms, parent.changeMode, parent.zoom],
-                [unitDefsItem, parent.unitDefs, parent.changeUnitMeasure, parent.unitIndex],
-                [rulerSizeItem, parent.rulerSize, parent.changeRulerSize, parent.rulerSize],
-                [colorsItem, parent.colors, parent.changeRulerColor, parent.defaultColors],
+            self.orientationItem = QAction("", self, triggered=lambda checked=False: parent.changeOrientation(0 if parent.oH else 1))
+            self.addAction(self.orientationItem)
+            # [menu, attribut des éléments, méthode, attribut de la valeur
+            # courante] / [menu, items attribute, method, current value
+            # attribute]
+            self.menuDefs = [
+                [zoomItem, "zooms", parent.changeMode, "zoom"],
+                [unitDefsItem, "unitDefs", parent.changeUnitMeasure, "unitIndex"],
+                [rulerSizeItem, "rulerSizes", parent.changeRulerSize, "rulerSize"],
+                [colorsItem, "colors", parent.changeRulerColor, "defaultColors"],
             ]
-            for menu in menuDefs:
-                for i, item in enumerate(menu[1]):
+            self.zoomDisabled = [unitDefsItem, colorsItem]
+            self.menuItems = []
+            for menu in self.menuDefs:
+                items = getattr(parent, menu[1])
+                actions = []
+                for i, item in enumerate(items):
                     item = QAction(item[0][0], self, triggered=partial(menu[2], i))
-                    if type(menu[3]) == type(list()) and i == len(menu[1]) - 1:
+                    if type(getattr(parent, menu[3])) == type(list()) and i == len(items) - 1:
                         menu[0].addSeparator()
-                        item.setEnabled(False if menu[1] == menu[3] else True)
                     else:
                         item.setCheckable(True)
-                        item.setChecked(True if i == menu[3] else False)
-                        item.setEnabled(not item.isChecked())
                     menu[0].addAction(item)
-                if menu[0] in [unitDefsItem, colorsItem]:
-                    menu[0].setEnabled(not bool(parent.zoom))
+                    actions.append(item)
+                self.menuItems.append(actions)
+                if menu[0] == zoomItem:
+                    menu[0].addSeparator()
+                    self.toggles = []
+                    for name, attribute, slot in [[gettext("Follow Cursor"), "zoomFollow", parent.changeZoomFollow], [gettext("Pixel Grid"), "zoomGrid", parent.changeZoomGrid], [gettext("Live Zoom"), "liveZoom", parent.changeLiveZoom]]:
+                        item = QAction(name, self, checkable=True, triggered=slot)
+                        menu[0].addAction(item)
+                        self.toggles.append([item, attribute])
                 self.addMenu(menu[0])
+            item = QAction(gettext("Snap to Edges"), self, checkable=True, triggered=parent.changeSnap)
+            self.addAction(item)
+            self.toggles.append([item, "snap"])
+            self.clearMarksItem = QAction(gettext("Clear Marks"), self, triggered=parent.clearMarks)
+            self.addAction(self.clearMarksItem)
+            self.addAction(QAction(gettext("Export Marks..."), self, triggered=parent.exportMarks))
             self.addSeparator()
-            self.addAction(QAction(parent.about, self, triggered=self.AboutDialog(parent).exec_))
+            # La boîte À propos n'est créée qu'à la demande. / The About box
+            # is only created on demand.
+            self.addAction(QAction(parent.about, self, triggered=parent.showAbout))
             self.addSeparator()
             self.addAction(QAction(gettext("Exit"), self, triggered=parent.close))
 
+        def refresh(self):
+            parent = self.parent
+            self.orientationItem.setText(parent.orientation[1 if not parent.oH else 0])
+            for menu, actions in zip(self.menuDefs, self.menuItems):
+                items, current = getattr(parent, menu[1]), getattr(parent, menu[3])
+                for i, item in enumerate(actions):
+                    if type(current) == type(list()) and i == len(actions) - 1:
+                        item.setEnabled(False if items == current else True)
+                    else:
+                        item.setChecked(True if i == current else False)
+                        item.setEnabled(not item.isChecked())
+                if menu[0] in self.zoomDisabled:
+                    menu[0].setEnabled(not bool(parent.zoom))
+            for item, attribute in self.toggles:
+                item.setChecked(getattr(parent, attribute))
+            self.clearMarksItem.setEnabled(bool(parent.marks))
+
         def exec_(self, point):
             Ruler.menu = True
+            self.refresh()
             super().exec_(point)
+            Ruler.menu = False
 
         def closeEvent(self, event):
             Ruler.menu = False
-            self.parent.mouseTimer.timeout.connect(self.parent.pollCursor)
+
+    class LiveZoom(QThread):
+        # Capture et agrandit en continu la zone demandée hors du fil de
+        # l'interface. Seule la dernière image est gardée : une image pas
+        # encore affichée est remplacée (et comptée dans dropped) plutôt que
+        # mise en file. / Continuously captures and magnifies the requested
+        # area outside the GUI thread. Only the latest frame is kept: a frame
+        # not yet displayed is replaced (and counted in dropped) rather than
+        # queued.
+        # Seuls les backends utilisables hors du fil de l'interface sont
+        # employés ; sinon unsupported est émis et la règle capture elle-même.
+        # / Only backends usable outside the GUI thread are used; otherwise
+        # unsupported is emitted and the ruler captures by itself.
+        frameReady = pyqtSignal()
+        unsupported = pyqtSignal()
+
+        def __init__(self, parent, fps, backend):
+            super().__init__(parent)
+            self.fps = max(1, fps)
+            self.backend = backend
+            self.mutex = QMutex()
+            self.running = False
+            self.request = None
+            # (image, début de sa capture) / (image, start of its capture)
+            self.frame = None
+            self.pending = False
+            self.frames = 0
+            self.dropped = 0
+
+        def configure(self, screen, winId, source, factor, grid, gridColor):
+            with QMutexLocker(self.mutex):
+                self.request = (screen, winId, QRect(source), factor, grid, QColor(gridColor))
+
+        def stop(self):
+            with QMutexLocker(self.mutex):
+                self.running = False
+                self.frame, self.pending = None, False
+            self.wait()
+
+        def takeFrame(self):
+            with QMutexLocker(self.mutex):
+                frame, self.frame, self.pending = self.frame, None, False
+            return frame
+
+        def start(self):
+            self.running = True
+            super().start()
+
+        def run(self):
+            from capture import CaptureError, captureBackend
+            interval = 1 / self.fps
+            capture = None
+            while True:
+                started = time()
+                with QMutexLocker(self.mutex):
+                    if not self.running:
+                        break
+                    screen, winId, source, factor, grid, gridColor = self.request
+                # Le backend est créé dans ce fil, qui est le seul à
+                # l'utiliser. / The backend is created in this thread, the
+                # only one using it.
+                if capture is None or capture.screen is not screen:
+                    if capture is not None:
+                        capture.close()
+                    capture = captureBackend(self.backend, screen, winId)
+                    if not capture.threadSafe:
+                        capture.close()
+                        capture = None
+                        self.unsupported.emit()
+                        break
+                # La capture ne concerne que la zone visible, avant
+                # agrandissement. / Only the visible area is captured, before
+                # magnification.
+                grabbed = perf_counter()
+                try:
+                    image = capture.grab(source)
+                except CaptureError:
+                    capture.close()
+                    capture = None
+                    self.unsupported.emit()
+                    break
+                image = magnify(image, factor, grid, gridColor)
+                with QMutexLocker(self.mutex):
+                    if self.frame is not None:
+                        self.dropped += 1
+                    self.frame = (image, grabbed)
+                    self.frames += 1
+                    notify, self.pending = not self.pending, True
+                if notify:
+                    self.frameReady.emit()
+                self.msleep(max(0, int((interval - (time() - started)) * 1000)))
+            if capture is not None:
+                capture.close()
 
     # Init de Ruler
-    def __init__(self):
+    # profile: None, "1" (mesures) ou "hud" (mesures affichées) / None, "1"
+    # (measurements) or "hud" (displayed measurements)
+    def __init__(self, profile=None, startupProfile=False):
         super().__init__()
+        startupMark("QMainWindow")
         self.dpiX = self.logicalDpiX()
         self.dpiY = self.logicalDpiY()
-        Ruler.logo, Ruler.menu= QPixmap(path.join(path.dirname(path.realpath(__file__)), "png", "%s.png" % PROJECT_NAME.lower())), False
+        Ruler.logo, Ruler.menu= resourcePixmap(PROJECT_NAME.lower()), False
         self.setWindowIcon(QIcon(Ruler.logo))
         self.setWindowFlags(Qt.Tool|Qt.FramelessWindowHint|Qt.WindowStaysOnTopHint)
         self.setContextMenuPolicy(Qt.CustomContextMenu)
         self.customContextMenuRequested.connect(self.openContextMenu)
         self.about = gettext("About")
         self.orientation = [ gettext("Horizontal"), gettext("Vertical") ]
+        # [[nom, abréviation], [pixels par unité X, Y], [unités par graduation
+        # principale, subdivisions moyennes, petites]] / [[name, abbreviation],
+        # [pixels per unit X, Y], [units per major tick, mid, minor subdivisions]]
+        scales = unitScales(self.dpiX, self.dpiY)
         self.unitDefs = [
-            [[gettext("Pixel"), gettext("px")], [1, 1]],
-            [[gettext("Point"), gettext("pt"), 1], [self.dpiX/6*2, self.dpiY/6*2]],
-            [[gettext("Inch"), gettext("in")], [self.dpiX, self.dpiY]],
-            [[gettext("Pica"), gettext("pc"), 1], [self.dpiX/6, self.dpiY/6]],
-            [[gettext("Centimeter"), gettext("cm")], [self.dpiX/2.54, self.dpiY/2.54]],
+            [[gettext("Pixel"), gettext("px")], scales[0], UNIT_TICKS[0]],
+            [[gettext("Point"), gettext("pt"), 1], scales[1], UNIT_TICKS[1]],
+            [[gettext("Inch"), gettext("in")], scales[2], UNIT_TICKS[2]],
+            [[gettext("Pica"), gettext("pc"), 1], scales[3], UNIT_TICKS[3]],
+            [[gettext("Centimeter"), gettext("cm")], scales[4], UNIT_TICKS[4]],
         ]
-        self.screen = app.desktop().screenGeometry().bottomRight()
         self.colors = [
             [[gettext("Text"), QColor(230, 230, 250)]],
             [[gettext("Background"), QColor(0, 30, 120)]],
@@ -170,32 +537,152 @@ class Ruler(QMainWindow):
             [[gettext("x2")]],
             [[gettext("x3")]],
             [[gettext("x4")]],
+            [[gettext("x8")]],
+            [[gettext("x16")]],
         ]
+        self.rulerSizes = zoomNames[:4]
         self.cursor = None
+        # Zone de la ligne du curseur dessinée au dernier affichage. /
+        # Area of the cursor line drawn by the last paint.
+        self.cursorRect = QRect()
+        self.paintedPixels = 0
+        self.paintedPixelsPerSecond = 0
+        self.paintedSince = time()
+        # Total depuis le lancement, pour les bancs d'essai. / Total since
+        # the launch, for the benchmarks.
+        self.paintedPixelTotal = 0
+        self.contextMenu = None
+        self.aboutDialog = None
+        self.startupProfile = startupProfile
+        self.profiler = None
+        self.hud = profile == "hud"
+        if profile and profile != "0":
+            folder = QStandardPaths.writableLocation(QStandardPaths.CacheLocation)
+            self.profiler = Profiler(path.join(folder, "profile.jsonl") if folder else "%s-profile.jsonl" % PROJECT_NAME.lower())
+        if self.hud:
+            # Le HUD est rafraîchi à part, les affichages partiels ne le
+            # couvrent pas. / The HUD is refreshed separately, partial paints
+            # do not cover it.
+            self.hudTimer = QTimer(self)
+            self.hudTimer.setInterval(500)
+            self.hudTimer.timeout.connect(lambda: self.invalidate(self.hudRect()))
+            self.hudTimer.start()
         self.mouseTimer = QTimer(self)
         self.defaultColors = deepcopy(self.colors)
 
         self.pix = None
+        self.scaleLayer = None
+        # Calques de graduation par clé, dont l'écran : passer d'un écran à
+        # l'autre ne les reconstruit pas. / Graduation layers by key, screen
+        # included: moving between screens does not rebuild them.
+        self.scaleLayers = OrderedDict()
+        # Textes de la graduation et de la position du curseur. / Texts of
+        # the graduation and of the cursor position.
+        self.labels = LabelCache()
         self.ps = app.primaryScreen()
-        self.csec = time()
+        # DPI, ratio, géométrie et facteurs d'unités de chaque écran. / DPI,
+        # ratio, geometry and unit factors of each screen.
+        self.screens = {}
+        self.watchedScreens = set()
+        # Déplacements au clavier cumulés et appliqués une fois par image,
+        # capture du fond différée jusqu'à la fin de la saisie. / Keyboard
+        # nudges accumulated and applied once per frame, background capture
+        # deferred until input is idle.
+        self.nudge = QPoint()
+        self.nudgeRepeats = 0
+        self.nudgeTimer = QTimer(self)
+        self.nudgeTimer.setSingleShot(True)
+        self.nudgeTimer.setInterval(16)
+        self.nudgeTimer.timeout.connect(self.applyNudge)
+        self.captureTimer = QTimer(self)
+        self.captureTimer.setSingleShot(True)
+        self.captureTimer.setInterval(250)
+        self.captureTimer.timeout.connect(self.saveBackground)
         self.moving = False
-        self.ps = app.primaryScreen()
         self.zooms = [
             [[gettext("None")]],
             [[zoomNames[1][0][0]]],
             [[zoomNames[2][0][0]]],
             [[zoomNames[3][0][0]]],
+            [[zoomNames[4][0][0]]],
+            [[zoomNames[5][0][0]]],
         ]
-        self.mark = deque(maxlen=2)
+        # Facteur d'agrandissement de chaque entrée de self.zooms. /
+        # Magnification factor of each entry of self.zooms.
+        self.zoomFactors = [1, 2, 3, 4, 8, 16]
+        self.zoomFrame = None
+        self.zoomFrameKey = None
+        self.dragSnapshot = None
+        self.dragOrigin = QPoint()
+        # Session de mesure : marques en coordonnées globales, gardées quand
+        # la règle bouge ou change de mode, et leur export au fil de l'eau. /
+        # Measurement session: marks in global coordinates, kept when the ruler
+        # moves or changes mode, and their streaming export.
+        self.marks = MarkSession()
+        self.markExport = None
+        # Enregistrement des entrées, voir inputtrace.py. / Input recording,
+        # see inputtrace.py.
+        self.recorder = None
+        # Rejeu d'une trace, voir benchmarks/replay.py : le curseur réel n'est
+        # pas scruté. / Replay of a trace, see benchmarks/replay.py: the real
+        # cursor is not polled.
+        self.replaying = False
         self.settings = QSettings(PROJECT_TEAM, PROJECT_NAME)
         self.rulerSize = 0
         self.unitIndex = 0
         self.oH = 0  # Set to true to set the orientation to horizontal.
         self.zoom = 0
+        self.zoomFollow = self.settings.value("Zoom/FollowCursor", False, type=bool)
+        self.zoomGrid = self.settings.value("Zoom/PixelGrid", False, type=bool)
+        self.liveZoom = self.settings.value("Zoom/Live", False, type=bool)
+        # Marge capturée autour de la règle quand on la déplace en zoom. /
+        # Margin captured around the ruler when it is dragged in zoom mode.
+        self.dragMargin = int(self.settings.value("Zoom/DragMargin", 512))
+        self.liveFrame = None
+        # Accroche du curseur et des marques aux bords de la capture, à moins
+        # de snapRadius pixels. / Snapping of the cursor and marks to the edges
+        # of the capture, within snapRadius pixels.
+        self.snap = self.settings.value("Snap/Enabled", False, type=bool)
+        self.snapRadius = int(self.settings.value("Snap/Radius", 8))
+        # Calculé une fois par capture et orientation. / Computed once per
+        # capture and orientation.
+        self.edges = None
+        self.edgeKey = None
+        # Géométrie de la dernière capture nulle ou de mauvaise taille (Wayland)
+        # : pas de nouvel essai avant un déplacement. / Geometry of the last
+        # null or wrongly sized capture (Wayland): no retry before a move.
+        self.failedCapture = None
+        # Backend de capture : "auto", "qscreen" ou "xshm", voir capture.py. /
+        # Capture backend: "auto", "qscreen" or "xshm", see capture.py.
+        self.captureName = self.settings.value("Capture/Backend", "auto")
+        # Créé à la première capture. / Created on the first capture.
+        self.capture = None
+        self.liveWorker = self.LiveZoom(self, int(self.settings.value("Zoom/LiveFPS", 30)), self.captureName)
+        self.liveWorker.frameReady.connect(self.takeLiveFrame)
+        self.liveWorker.unsupported.connect(self.startLiveFallback)
+        # Zoom direct dans le fil de l'interface, quand aucun backend n'est
+        # utilisable par LiveZoom (QScreen, erreur de capture). / Live zoom in
+        # the GUI thread, when no backend is usable by LiveZoom (QScreen,
+        # capture error).
+        self.liveFallback = False
+        self.liveTimer = QTimer(self)
+        self.liveTimer.setInterval(int(1000 / self.liveWorker.fps))
+        self.liveTimer.timeout.connect(self.grabLiveFrame)
         self.cursorMove.connect(self.handleCursorMove)
-        self.mouseTimer.setInterval(50)
+        # Fréquences de scrutation du curseur en Hz : rapide près de la règle,
+        # lente sinon ou après pollIdle secondes sans mouvement. / Cursor poll
+        # rates in Hz: fast near the ruler, slow when far or after pollIdle
+        # seconds without movement.
+        self.pollRates = [max(1, int(self.settings.value(item[0], item[1]))) for item in [["Poll/FastRate", 120], ["Poll/SlowRate", 10]]]
+        self.pollFast, self.pollSlow = [1000 // rate for rate in self.pollRates]
+        self.pollIdle = 1.0
+        self.pollMargin = 50
+        self.polledCursor = None
+        self.cursorSince = time()
+        # Connecté une seule fois, démarré par showEvent. / Connected once,
+        # started by showEvent.
+        self.mouseTimer.setInterval(self.pollSlow)
         self.mouseTimer.timeout.connect(self.pollCursor)
-        self.mouseTimer.start()
         for i, item in enumerate([ "Colors/Text", "Colors/Background", "Colors/Highlight" ]):
             if (type(self.settings.value(item, None)) == type(QColor())) and self.settings.value(item, None).isValid():
                 self.colors[i][0][1]= self.settings.value(item)
@@ -209,6 +696,14 @@ class Ruler(QMainWindow):
         for item in settingsToProperties:
             if int(self.settings.value(item[0], -1)) in range(1, item[2]):
                 setattr(self, item[1], int(self.settings.value(item[0])))
+        startupMark("settings")
+        # La règle suit l'écran sur lequel elle se trouve. / The ruler follows
+        # the screen it is on.
+        self.winId()
+        self.windowHandle().screenChanged.connect(self.changeScreen)
+        app.screenAdded.connect(self.screensChanged)
+        app.screenRemoved.connect(self.screensChanged)
+        self.changeScreen(self.windowHandle().screen())
         self.changeRulerSize(self.rulerSize)
         self.changeOrientation(self.oH)
         if self.settings.contains("GUI/Position"):
@@ -229,134 +724,577 @@ class Ruler(QMainWindow):
             ["Colors/Text", self.colors[0][0][1]],
             ["Colors/Background", self.colors[1][0][1]],
             ["Colors/Highlight", self.colors[2][0][1]],
+            ["Poll/FastRate", self.pollRates[0]],
+            ["Poll/SlowRate", self.pollRates[1]],
+            ["Zoom/FollowCursor", self.zoomFollow],
+            ["Zoom/PixelGrid", self.zoomGrid],
+            ["Zoom/Live", self.liveZoom],
+            ["Zoom/DragMargin", self.dragMargin],
+            ["Zoom/LiveFPS", self.liveWorker.fps],
+            ["Capture/Backend", self.captureName],
+            ["Snap/Enabled", self.snap],
+            ["Snap/Radius", self.snapRadius],
+            ["Marks/Export", self.markExport.filename if self.markExport is not None else ""],
         ]
         for item in propertiesToSettings:
             self.settings.setValue(item[0], item[1])
         self.settings.sync()
+        self.liveWorker.stop()
+        if self.markExport is not None:
+            self.markExport.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.capture is not None:
+            self.capture.close()
+        if self.profiler is not None:
+            self.profiler.dump()
         app.quit()
 
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not self.replaying:
+            self.mouseTimer.start()
+        self.updateLiveZoom()
+
+    def hideEvent(self, event):
+        # Aucune scrutation tant que la règle est cachée. / No polling while
+        # the ruler is hidden.
+        self.mouseTimer.stop()
+        super().hideEvent(event)
+        self.updateLiveZoom()
+
+    def moveEvent(self, event):
+        super().moveEvent(event)
+        if self.liveWorker.isRunning() or self.liveTimer.isActive():
+            self.updateLiveZoom()
+
+    def changeEvent(self, event):
+        if event.type() == QEvent.FontChange:
+            self.labels.clear()
+            self.scaleLayers.clear()
+            self.scaleLayer = None
+            self.invalidate()
+        elif event.type() == QEvent.WindowStateChange:
+            if self.isMinimized():
+                self.mouseTimer.stop()
+            elif self.isVisible():
+                self.mouseTimer.start()
+            self.updateLiveZoom()
+        super().changeEvent(event)
+
     def keyPressEvent(self, event):
+        if self.recorder is not None:
+            self.recorder.write(KEY_REPEAT if event.isAutoRepeat() else KEY_PRESS, event.key(), int(event.modifiers()))
         if event.key() == Qt.Key_Escape:
             self.close()
         elif event.key() in [ Qt.Key_Left, Qt.Key_Right, Qt.Key_Up, Qt.Key_Down ]:
-            if time() > self.csec + 1:
-                point= self.frameGeometry().topLeft()
-                unitIndex = 10 if (event.modifiers() == Qt.ControlModifier) else 1
-                if event.key() == Qt.Key_Left and point.x() >= unitIndex:
-                    point.setX(point.x() - unitIndex)
-                elif event.key() == Qt.Key_Right and point.x() + self.width() <= self.screen.x():
-                    point.setX(point.x() + unitIndex)
-                elif event.key() == Qt.Key_Up and point.y() >= unitIndex:
-                    point.setY(point.y() - unitIndex)
-                elif event.key() == Qt.Key_Down and point.y() + self.height() <= self.screen.y():
-                    point.setY(point.y() + unitIndex)
-                self.move(point)
-                self.repaint()
-                self.csec= time()
-                self.saveBackground()
+            unitIndex = 10 if (event.modifiers() == Qt.ControlModifier) else 1
+            # Une touche maintenue accélère jusqu'à x8. / A held key
+            # accelerates up to x8.
+            self.nudgeRepeats = self.nudgeRepeats + 1 if event.isAutoRepeat() else 0
+            unitIndex *= min(8, 1 + self.nudgeRepeats // 10)
+            if event.key() == Qt.Key_Left:
+                self.nudge.setX(self.nudge.x() - unitIndex)
+            elif event.key() == Qt.Key_Right:
+                self.nudge.setX(self.nudge.x() + unitIndex)
+            elif event.key() == Qt.Key_Up:
+                self.nudge.setY(self.nudge.y() - unitIndex)
+            elif event.key() == Qt.Key_Down:
+                self.nudge.setY(self.nudge.y() + unitIndex)
+            if not self.nudgeTimer.isActive():
+                self.nudgeTimer.start()
+            self.captureTimer.start()
         else:
             super().keyPressEvent(event)
 
+    def keyReleaseEvent(self, event):
+        if self.recorder is not None:
+            self.recorder.write(KEY_RELEASE, event.key(), int(event.modifiers()))
+        if not event.isAutoRepeat():
+            self.nudgeRepeats = 0
+        super().keyReleaseEvent(event)
+
+    def applyNudge(self):
+        # Bornes de l'ensemble des écrans. / Bounds of all the screens.
+        screen = self.screenInfo(self.ps)["virtualGeometry"]
+        point = self.frameGeometry().topLeft() + self.nudge
+        point.setX(min(max(point.x(), screen.left()), screen.right() + 1 - self.width()))
+        point.setY(min(max(point.y(), screen.top()), screen.bottom() + 1 - self.height()))
+        self.nudge = QPoint()
+        if point != self.frameGeometry().topLeft():
+            self.move(point)
+            self.invalidate()
+
     def mouseDoubleClickEvent(self, event):
-        if not self.unitIndex:
-            self.mark.append(event.pos())
-            if len(self.mark) == 2:
-                QMessageBox.information(self, "\0", str(event.pos().y() - self.mark[0].y() if self.oH else event.pos().x() - self.mark[0].x()).replace("-", ""), QMessageBox.Ok)
-                self.mark.clear()
+        if self.recorder is not None:
+            self.recorder.write(DOUBLE_CLICK, event.pos().x(), event.pos().y())
+        # Un double clic sur une marque la retire, ailleurs il en ajoute une. /
+        # A double click on a mark removes it, elsewhere it adds one.
+        cp = self.mapToParent(self.snapPoint(event.pos()))
+        index = self.marks.find(cp.y() if self.oH else cp.x(), 3)
+        if index is None:
+            self.addMark(cp)
+        else:
+            self.removeMark(index)
 
     def mousePressEvent(self, event):
         if event.button() == Qt.LeftButton:
+            if self.recorder is not None:
+                self.recorder.write(DRAG_START, event.pos().x(), event.pos().y())
             self.offset, self.moving= event.pos(), True
-            self.repaint()
+            if self.zoom and not self.liveZoom:
+                self.takeDragSnapshot()
+            self.invalidate()
         else:
             super().mousePressEvent(event)
 
     def mouseReleaseEvent(self, event):
         if event.button() == Qt.LeftButton:
+            if self.recorder is not None:
+                self.recorder.write(DRAG_END)
             self.saveBackground()
             self.offset, self.moving= None, False
+            self.dragSnapshot = None
         else:
             super().mouseReleaseEvent(event)
 
     def mouseMoveEvent(self, event):
-        self.mark.clear()
+        if self.recorder is not None:
+            self.recorder.write(DRAG_MOVE, event.globalPos().x(), event.globalPos().y())
         self.move(self.mapToParent(event.pos() - self.offset))
+        if self.marks:
+            # Les marques restent en place sur l'écran. / The marks stay in
+            # place on the screen.
+            self.invalidate()
+        if self.dragSnapshot is not None:
+            self.invalidate()
+        self.invalidateCursor()
 
     def paintEvent(self, event):
+        started = perf_counter()
+        if self.startupProfile:
+            startupMark("event loop")
+        self.countPaintedPixels(event)
         qp = QPainter()
-        unit = self.unitDefs[self.unitIndex][1][self.oH]
-        count = -1
-        # ^ C'est le nombre indiqué sur la règle. /
-        #   This is the number shown on the ruler.
-        first = 10
-        mid = 15
-        last = 20
         qp.begin(self)
         qp.setPen(self.colors[0][0][1])
         if self.zoom:
-            if not self.moving:
+            if self.liveZoom:
+                if self.liveFrame is not None:
+                    qp.drawImage(0, 0, self.liveFrame)
+                else:
+                    qp.setBrush(self.colors[1][0][1])
+                    qp.drawRect(-1, -1, self.width() + 1, self.height() + 1)
+            elif not self.moving:
                 if self.pix is None:
                     self.saveBackground()
-                qp.drawPixmap(0, 0, self.pix.scaled(self.size() * (self.zoom + 1), Qt.KeepAspectRatio))
+                qp.drawImage(0, 0, self.magnifiedFrame(self.pix))
+            elif self.dragSnapshot is not None:
+                # Pendant le déplacement, le zoom suit la règle dans la
+                # capture prise au début. / While dragging, the zoom follows
+                # the ruler in the snapshot taken at the start.
+                size = self.dragSnapshot.size() / self.dragSnapshot.devicePixelRatio()
+                offset = self.pos() - self.dragOrigin
+                offset = QPoint(min(max(offset.x(), 0), size.width() - self.width()), min(max(offset.y(), 0), size.height() - self.height()))
+                qp.drawImage(0, 0, self.magnifiedFrame(self.dragSnapshot, offset))
             else:
                 qp.setBrush(self.colors[1][0][1])
                 qp.drawRect(-1, -1, self.width() + 1, self.height() + 1)
         else:
+            # La graduation est dessinée une fois dans un calque. /
+            # The graduation is drawn once into a cached layer.
+            # Seule la zone invalidée est recopiée. / Only the invalidated area is copied.
+            self.updateScaleLayer()
+            rect, ratio = event.rect(), self.scaleLayer.devicePixelRatio()
+            qp.drawPixmap(QRectF(rect), self.scaleLayer, QRectF(rect.x() * ratio, rect.y() * ratio, rect.width() * ratio, rect.height() * ratio))
             qp.setBrush(self.colors[1][0][1])
-            qp.drawRect(-1, -1, self.width() + 1, self.height() + 1)
-            # Affichage de la graduation / incremental display
-            for i in range(self.height() if self.oH else self.width()):
-                length= 0
-                # Affichage en pixel / pixel-based increments
-                if not self.unitIndex:
-                    # length, count = last if not i % 50 else mid if not i % 10 else first if not i % 2 else 0, count + 1
-                    # ^ Il n'y a pas besoin de se crâner. / There is no need to show off.
-                    length = 0
-                    if i % 50 == 0:
-                        length = last
-                    elif i % 10 == 0:
-                        length = mid
-                    elif i % 2 == 0:
-                        length = first
-
-                    count = count + 1
-                # Autre unité / other unit of measure
-                else:
-                    if (self.unitIndex in [ 1, 2, 3 ] and not i % unit) or (self.unitIndex == 4 and not i % round(unit)):
-                        length, count = last, count + 1
-                    elif (self.unitIndex in [ 1, 2, 3 ] and not i % (unit / 4)) or (self.unitIndex == 4 and not i % round(unit / 2)):
-                        length= first
-                cS= self.fontMetrics().tightBoundingRect(str(count) if count else self.unitDefs[self.unitIndex][0][1])
-                # Unités d'affichage et lignes. / Display units and lines.
-                if i == 1:
-                    # Dessinez des messages globaux sur la première colonne de pixels. / Draw global messages at the first column of pixels.
-                    if self.oH:
-                        qp.drawText((self.width() - cS.width()) / 2, cS.height(), self.unitDefs[self.unitIndex][0][1]  + " " + str(self.dpiX) + "dpi")
-                    else:
-                        qp.drawText(3, self.height() / 2 + cS.height() / 3, self.unitDefs[self.unitIndex][0][1]  + " " + str(self.dpiX) + "dpi")
-                elif i and length:
-                    # Tracez une ligne car une longueur non nulle indique qu'il s'agit d'un incrément. / Draw a line since a non-zero length indicates this is an increment.
-                    if self.oH:
-                        qp.drawLine(0, i, length, i)
-                        qp.drawLine(self.width(), i, self.width() - length - 1, i)
-                        if length == last:
-                            qp.drawText((self.width() - cS.width()) / 2, i + cS.height() / 2, str(count))
-                    else:
-                        qp.drawLine(i, 0, i, length)
-                        qp.drawLine(i, self.height(), i, self.height() - length - 1)
-                        if length == last:
-                            qp.drawText(i - cS.width() / 2, self.height() / 2 + cS.height() / 2, str(count))
             # Affichage de la position du curseur / Display the cursor position.
-            if self.cursor is not None and not Ruler.menu and (self.oH and self.mapFromParent(self.cursor).y() > -1 or not self.oH and self.mapFromParent(self.cursor).x() > -1) and (self.oH and self.mapFromParent(self.cursor).y() < self.height() or not self.oH and self.mapFromParent(self.cursor).x() < self.width()):
-                self.drawCursorPosition(qp, self.mapFromParent(self.cursor))
-            if not self.unitIndex:
-                # Affichage des positions sauvegardés / Display saved positions.
-                for m in self.mark:
-                    self.drawCursorPosition(qp, m)
+            cp = self.visibleCursor()
+            if cp is not None:
+                self.drawCursorPosition(qp, cp)
+            # Affichage des positions sauvegardés / Display saved positions.
+            self.drawMarks(qp, event.rect())
+        if self.hud:
+            self.drawHud(qp)
+        qp.end()
+        if self.profiler is not None:
+            self.profiler.painted(started)
+        if self.startupProfile:
+            # Rapport puis sortie, pour mesurer un lancement. / Report then
+            # exit, to measure a launch.
+            self.startupProfile = False
+            startupMark("first paint")
+            print(startupReport())
+            QTimer.singleShot(0, app.quit)
+
+    def hudLines(self):
+        # [nom, valeurs, compte ou None] de chaque mesure. / [name, values,
+        # count or None] of each measurement.
+        lines = []
+        for name, values in [["paint", self.profiler.paints], ["input", self.profiler.latencies], ["capture", self.profiler.captures]]:
+            stats = self.profiler.stats(values)
+            lines.append([name, ["%.1f" % value for value in stats] if stats else ["-"], None])
+        lines[-1][2] = "(%d)" % self.profiler.captureCount
+        lines.append(["pixels", ["%dk/s" % (self.paintedPixelsPerSecond // 1000)], None])
+        if self.profiler.liveFrameCount:
+            lines.append(["live", ["%.1f" % value for value in self.profiler.stats(self.profiler.liveLatencies)], None])
+            lines.append(["frames", ["%.1f/s" % self.profiler.liveFramesPerSecond], None])
+            lines.append(["drops", ["%d" % self.profiler.liveDropCount], None])
+        return lines
+
+    def hudLayout(self):
+        # Coin haut droit de la règle : colonnes de mesures le long d'une
+        # règle horizontale, noms et valeurs empilés sur une règle verticale.
+        # Renvoie le rectangle du HUD et [rectangle, lignes] de chaque colonne.
+        # / Top right corner of the ruler: columns of measurements along a
+        # horizontal ruler, names and values stacked on a vertical ruler.
+        # Returns the rectangle of the HUD and [rectangle, lines] of each
+        # column.
+        metrics = self.fontMetrics()
+        lineHeight = metrics.lineSpacing()
+        if self.oH:
+            lines = []
+            for name, values, count in self.hudLines():
+                lines += [name] + values + ([count] if count else [])
+            blocks = [[QRect(0, 0, self.width(), len(lines) * lineHeight + 2), lines]]
+        else:
+            rows = max(1, (self.height() - 2) // lineHeight)
+            lines = ["%s %s%s" % (name, "/".join(values), " " + count if count else "") for name, values, count in self.hudLines()]
+            columns = [lines[i:i + rows] for i in range(0, len(lines), rows)]
+            widths = [max(metrics.horizontalAdvance(line) for line in column) + 6 for column in columns]
+            x = self.width() - sum(widths)
+            blocks = []
+            for width, column in zip(widths, columns):
+                blocks.append([QRect(x, 0, width, len(column) * lineHeight + 2), column])
+                x += width
+        rect = QRect()
+        for block in blocks:
+            rect = rect.united(block[0])
+        return rect.intersected(self.rect()), blocks
+
+    def hudRect(self):
+        return self.hudLayout()[0]
+
+    def drawHud(self, qp):
+        rect, blocks = self.hudLayout()
+        qp.setPen(Qt.NoPen)
+        qp.setBrush(QColor(0, 0, 0, 160))
+        qp.drawRect(rect)
+        qp.setPen(QColor(255, 255, 255))
+        for block, lines in blocks:
+            qp.drawText(block.adjusted(4, 1, -2, -1), Qt.AlignLeft | Qt.AlignTop, "\n".join(lines))
+
+    def countPaintedPixels(self, event):
+        # Compteur de pixels redessinés par seconde. / Counter of repainted pixels per second.
+        pixels = sum(rect.width() * rect.height() for rect in event.region().rects())
+        self.paintedPixels += pixels
+        self.paintedPixelTotal += pixels
+        elapsed = time() - self.paintedSince
+        if elapsed >= 1:
+            self.paintedPixelsPerSecond = int(self.paintedPixels / elapsed)
+            self.paintedPixels, self.paintedSince = 0, time()
+            if self.profiler is not None:
+                self.profiler.pixelRates.append(self.paintedPixelsPerSecond)
+
+    def visibleCursor(self):
+        # Position locale du curseur s'il est dans la règle, sinon None. /
+        # Local cursor position if it lies within the ruler, otherwise None.
+        if self.cursor is None or Ruler.menu:
+            return None
+        cp = self.mapFromParent(self.cursor)
+        if (self.oH and -1 < cp.y() < self.height()) or (not self.oH and -1 < cp.x() < self.width()):
+            return self.snapPoint(cp)
+        return None
+
+    def edgeIndex(self):
+        # Bords de la capture de fond le long de la règle, voir model.py ; None
+        # sans capture à jour, qui est alors demandée. / Edges of the
+        # background capture along the ruler, see model.py; None without an up
+        # to date capture, which is then requested.
+        if self.pix is None or self.pix.size() / self.pix.devicePixelRatio() != self.size():
+            if not self.captureTimer.isActive() and self.failedCapture != self.geometry():
+                self.captureTimer.start()
+            return None
+        key = (self.pix.cacheKey(), self.oH)
+        if key != self.edgeKey:
+            image = self.pix if self.pix.depth() == 32 else self.pix.convertToFormat(QImage.Format_RGB32)
+            # Vue directe sur les pixels de la capture. / Direct view on the
+            # pixels of the capture.
+            bits = image.constBits()
+            bits.setsize(image.byteCount())
+            self.edges = edgeIndex(bits, image.width(), image.height(), image.bytesPerLine(), self.oH, image.devicePixelRatio())
+            self.edgeKey = key
+        return self.edges
+
+    def snapPoint(self, cp):
+        # cp accroché au bord le plus fort à portée, dans toutes les unités. /
+        # cp snapped to the strongest edge in reach, in every unit.
+        edges = self.edgeIndex() if self.snap else None
+        if not edges:
+            return cp
+        if self.oH:
+            return QPoint(cp.x(), edges.snap(cp.y(), self.snapRadius))
+        return QPoint(edges.snap(cp.x(), self.snapRadius), cp.y())
+
+    def cursorBand(self, cp):
+        # Rectangle couvrant la ligne du curseur et sa boîte d'étiquette, voir
+        # drawCursorPosition. / Rectangle covering the cursor line and its
+        # label box, see drawCursorPosition.
+        if cp is None or self.zoom:
+            return QRect()
+        cS= self.labels.get(str(cp.y() if self.oH else cp.x()), self.font(), self.colors[2][0][1])[1]
+        if self.oH:
+            margin = cS.height() + 6
+            band = QRect(0, cp.y() - margin, self.width(), 2 * margin + 1)
+        else:
+            margin = cS.width() + 6
+            band = QRect(cp.x() - margin, 0, 2 * margin + 1, self.height())
+        return band.intersected(self.rect())
+
+    def invalidate(self, rect=None):
+        # Point d'entrée unique pour demander un affichage; Qt regroupe les
+        # zones. / Single entry point to request a paint; Qt coalesces areas.
+        if rect is None:
+            rect = self.rect()
+        if not rect.isEmpty():
+            if self.profiler is not None:
+                self.profiler.requestCount += 1
+            self.update(rect)
+
+    def invalidateCursor(self):
+        # N'invalide que l'ancienne et la nouvelle ligne du curseur. /
+        # Only invalidate the previous and the new cursor line.
+        band = self.cursorBand(self.visibleCursor())
+        # Curseur resté sur le même bord ou pixel : rien à redessiner. /
+        # Cursor still on the same edge or pixel: nothing to repaint.
+        if band == self.cursorRect:
+            if self.profiler is not None:
+                self.profiler.skipCount += 1
+            return
+        rect = self.cursorRect.united(band)
+        if self.profiler is not None and not rect.isEmpty():
+            self.profiler.cursorMoved()
+        self.invalidate(rect)
+        self.cursorRect = band
+
+    def zoomOrigin(self, cp):
+        # Coin haut gauche de la zone agrandie, relatif à la zone source :
+        # centrée sur le curseur cp ou ancrée en haut à gauche. / Top left
+        # corner of the magnified area, relative to the source area: centred
+        # on the cursor cp or anchored at the top left.
+        factor = self.zoomFactors[self.zoom]
+        visible = QSize(ceil(self.width() / factor), ceil(self.height() / factor))
+        if not self.zoomFollow or cp is None:
+            return QPoint(0, 0), visible
+        x = min(max(cp.x() - visible.width() // 2, 0), self.width() - visible.width())
+        y = min(max(cp.y() - visible.height() // 2, 0), self.height() - visible.height())
+        return QPoint(x, y), visible
+
+    def magnifiedFrame(self, image, offset=QPoint(0, 0)):
+        # Seule la zone visible de la capture est agrandie, au plus proche
+        # voisin, et gardée tant que la capture, le facteur ou l'origine ne
+        # changent pas. offset est la position de la règle dans image. /
+        # Only the visible area of the capture is magnified, nearest
+        # neighbour, and kept until the capture, the factor or the origin
+        # change. offset is the position of the ruler within image.
+        factor = self.zoomFactors[self.zoom]
+        origin, visible = self.zoomOrigin(self.mapFromParent(self.cursor) if self.cursor is not None else None)
+        key = (image.cacheKey(), factor, origin.x(), origin.y(), self.zoomGrid, offset.x(), offset.y())
+        if self.zoomFrame is not None and key == self.zoomFrameKey:
+            return self.zoomFrame
+        ratio = image.devicePixelRatio()
+        source = QRect((offset + origin) * ratio, visible * ratio)
+        self.zoomFrame = image.copy(source).scaled(source.size() * factor, Qt.IgnoreAspectRatio, Qt.FastTransformation)
+        self.zoomFrame.setDevicePixelRatio(ratio)
+        self.zoomFrameKey = key
+        if self.zoomGrid and factor >= 4:
+            drawPixelGrid(self.zoomFrame, factor, ratio, self.colors[1][0][1])
+        return self.zoomFrame
+
+    def takeDragSnapshot(self):
+        # Une seule capture au début du déplacement, limitée à une marge
+        # autour de la règle pour borner la mémoire. La règle y est remplacée
+        # par le fond capturé sous elle. / A single capture when the drag
+        # starts, limited to a margin around the ruler to bound memory. The
+        # ruler is replaced in it by the background captured under it.
+        started = perf_counter()
+        margin = self.dragMargin
+        area = self.frameGeometry().adjusted(-margin, -margin, margin, margin).intersected(self.screenInfo(self.ps)["geometry"])
+        snapshot = self.captureScreen(area).copy()
+        if self.profiler is not None:
+            self.profiler.captured(started)
+        if self.pix is not None:
+            qp = QPainter()
+            qp.begin(snapshot)
+            qp.drawImage(self.pos() - area.topLeft(), self.pix)
+            qp.end()
+        self.dragSnapshot, self.dragOrigin = snapshot, area.topLeft()
+
+    def liveSource(self):
+        # Zone capturée en zoom direct : la bande de même taille à côté de la
+        # règle, pour ne jamais avoir à la cacher. / Area captured in live
+        # zoom: the strip of the same size next to the ruler, so that it never
+        # has to be hidden.
+        geometry = self.frameGeometry()
+        screen = self.screenInfo(self.ps)["geometry"]
+        if self.oH:
+            strip = geometry.translated(-geometry.width(), 0) if geometry.left() - geometry.width() >= screen.left() else geometry.translated(geometry.width(), 0)
+        else:
+            strip = geometry.translated(0, -geometry.height()) if geometry.top() - geometry.height() >= screen.top() else geometry.translated(0, geometry.height())
+        origin, visible = self.zoomOrigin(self.cursor - strip.topLeft() if self.cursor is not None else None)
+        return QRect(strip.topLeft() + origin, visible)
+
+    def updateLiveZoom(self):
+        # Démarre, reconfigure ou arrête le zoom direct selon l'état de la
+        # règle. / Start, reconfigure or stop the live zoom depending on the
+        # state of the ruler.
+        if self.zoom and self.liveZoom and self.isVisible() and not self.isMinimized():
+            if self.liveFallback:
+                if not self.liveTimer.isActive():
+                    self.liveTimer.start()
+                return
+            self.liveWorker.configure(self.ps, app.desktop().winId(), self.liveSource(), self.zoomFactors[self.zoom], self.zoomGrid, self.colors[1][0][1])
+            if not self.liveWorker.isRunning():
+                self.liveWorker.start()
+        elif self.liveWorker.isRunning() or self.liveTimer.isActive():
+            self.liveTimer.stop()
+            self.liveWorker.stop()
+            self.liveFrame = None
+
+    def startLiveFallback(self):
+        # Jusqu'à la fin de la session. / Until the end of the session.
+        self.liveWorker.stop()
+        self.liveFallback = True
+        self.updateLiveZoom()
+
+    def grabLiveFrame(self):
+        started = perf_counter()
+        self.liveFrame = magnify(self.captureScreen(self.liveSource()), self.zoomFactors[self.zoom], self.zoomGrid, self.colors[1][0][1])
+        if self.profiler is not None:
+            self.profiler.liveFrame(started)
+        self.invalidate()
+
+    def takeLiveFrame(self):
+        frame = self.liveWorker.takeFrame()
+        if frame is not None:
+            self.liveFrame = frame[0]
+            if self.profiler is not None:
+                self.profiler.liveFrame(frame[1], self.liveWorker.dropped)
+            self.invalidate()
+
+    def scaleLayerKey(self):
+        # Tout ce dont dépend le rendu de la graduation. /
+        # Everything the rendering of the graduation depends on.
+        return (
+            self.unitIndex,
+            self.oH,
+            self.rulerSize,
+            self.width(),
+            self.height(),
+            self.font().key(),
+            tuple(color[0][1].rgba() for color in self.colors[:-1]),
+            self.dpiX,
+            self.dpiY,
+            self.devicePixelRatioF(),
+        )
+
+    def updateScaleLayer(self):
+        key = self.scaleLayerKey()
+        if key in self.scaleLayers:
+            self.scaleLayers.move_to_end(key)
+            self.scaleLayer = self.scaleLayers[key]
+            return
+        ratio = key[-1]
+        self.scaleLayer = self.scaleLayers[key] = QPixmap(self.size() * ratio)
+        self.scaleLayer.setDevicePixelRatio(ratio)
+        if len(self.scaleLayers) > 8:
+            self.scaleLayers.popitem(last=False)
+        qp = QPainter()
+        qp.begin(self.scaleLayer)
+        qp.setFont(self.font())
+        qp.setPen(self.colors[0][0][1])
+        qp.setBrush(self.colors[1][0][1])
+        qp.drawRect(-1, -1, self.width() + 1, self.height() + 1)
+        self.drawScale(qp)
+        qp.end()
+
+    def screenInfo(self, screen):
+        info = self.screens.get(screen.name())
+        if info is None:
+            dpiX, dpiY = round(screen.logicalDotsPerInchX()), round(screen.logicalDotsPerInchY())
+            info = self.screens[screen.name()] = {
+                "dpi": (dpiX, dpiY),
+                "geometry": screen.geometry(),
+                "virtualGeometry": screen.virtualGeometry(),
+                "scales": unitScales(dpiX, dpiY),
+            }
+            # Une modification de l'écran invalide son entrée. / A change of
+            # the screen invalidates its entry.
+            if screen.name() not in self.watchedScreens:
+                self.watchedScreens.add(screen.name())
+                for signal in [screen.logicalDotsPerInchChanged, screen.geometryChanged, screen.virtualGeometryChanged]:
+                    signal.connect(partial(self.screenUpdated, screen))
+        return info
+
+    def screenUpdated(self, screen, *args):
+        self.screens.pop(screen.name(), None)
+        if screen is self.ps:
+            self.changeScreen(screen)
+
+    def screensChanged(self, screen):
+        # Un écran ajouté ou retiré peut déplacer les autres. / An added or
+        # removed screen may move the others.
+        self.screens.clear()
+        self.watchedScreens.discard(screen.name())
+        if self.windowHandle() is not None and self.windowHandle().screen() is not None:
+            self.changeScreen(self.windowHandle().screen())
+
+    def changeScreen(self, screen):
+        info = self.screenInfo(screen)
+        changed = screen is not self.ps
+        self.ps = screen
+        if (self.dpiX, self.dpiY) != info["dpi"]:
+            self.dpiX, self.dpiY = info["dpi"]
+            # Les dimensions des textes dépendent du DPI. / Text metrics
+            # depend on the DPI.
+            self.labels.clear()
+        for unitDef, scale in zip(self.unitDefs, info["scales"]):
+            unitDef[1] = scale
+        if changed:
+            # Les captures suivent l'écran de la règle. / Captures follow the
+            # screen of the ruler.
+            if self.capture is not None:
+                self.capture.close()
+                self.capture = None
+            self.pix = None
+            self.updateLiveZoom()
+        self.cursorRect = QRect()
+        self.invalidate()
+
+    def rulerModel(self):
+        # Géométrie de la règle sans Qt, voir model.py. / Geometry of the
+        # ruler without Qt, see model.py.
+        return RulerModel(self.unitIndex, self.oH, self.dpiX, self.dpiY, self.height() if self.oH else self.width(), [unitDef[1] for unitDef in self.unitDefs], [unitDef[2] if len(unitDef) > 2 else [1, 0, 4] for unitDef in self.unitDefs])
+
+    def unitTicks(self):
+        # Graduations de l'unité pour la longueur actuelle de la règle. /
+        # Ticks of the unit for the current length of the ruler.
+        return self.rulerModel().ticks()
+
+    def drawScale(self, qp):
+        # Affichage de la graduation / incremental display
+        unit = self.unitDefs[self.unitIndex][0][1]
+        drawGraduation(qp, self.labels, self.unitTicks(), self.oH, self.width(), self.height(), "1" if not self.unitIndex else unit, unit + " " + str(self.dpiX) + "dpi")
+
+    def labelRect(self, qp, text):
+        return self.labels.get(text, qp.font(), qp.pen().color())[1]
+
+    def drawLabel(self, qp, x, y, text):
+        drawLabel(qp, self.labels, x, y, text)
 
     def drawCursorPosition(self, qp, cp):
         qp.setPen(QPen(self.colors[2][0][1], 1, Qt.DashLine))
-        cS= self.fontMetrics().tightBoundingRect(str(cp.y() if self.oH else cp.x()))
+        cS= self.labelRect(qp, str(cp.y() if self.oH else cp.x()))
         # Unité autre que pixel, juste ligne hachurée
         if self.unitIndex:
             if self.oH:
@@ -367,8 +1305,8 @@ class Ruler(QMainWindow):
         else:
             # Affichage vertical
             if self.oH:
-                qp.drawLine(0, cp.y(), (self.width() / 2) - (cS.width() / 2), cp.y())
-                qp.drawLine((self.width() / 2) + (cS.width() / 2), cp.y(), self.width(), cp.y())
+                qp.drawLine(QLineF(0, cp.y(), (self.width() / 2) - (cS.width() / 2), cp.y()))
+                qp.drawLine(QLineF((self.width() / 2) + (cS.width() / 2), cp.y(), self.width(), cp.y()))
                 qp.setPen(QPen(Qt.NoPen))
                 # Curseur en deça de la fenêtre
                 if cp.y() - cS.height() / 2 < 1:
@@ -381,13 +1319,13 @@ class Ruler(QMainWindow):
                     y= cp.y() + cS.height() / 2
                 # Mode zoom
                 if not self.zoom:
-                    qp.drawRect((self.width() / 2 - cS.width() / 2) - 2, y - cS.height() - 2, cS.width() + 4, cS.height() + 4)
+                    qp.drawRect(QRectF((self.width() / 2 - cS.width() / 2) - 2, y - cS.height() - 2, cS.width() + 4, cS.height() + 4))
                 qp.setPen(QPen(self.colors[2][0][1], 1, Qt.SolidLine))
-                qp.drawText(self.width() / 2 - cS.width() / 2, y, str(cp.y()))
+                self.drawLabel(qp, self.width() / 2 - cS.width() / 2, y, str(cp.y()))
             # Affichage horizontcal
             else:
-                qp.drawLine(cp.x(), 0, cp.x(), (self.height() / 2) - (cS.height() / 2))
-                qp.drawLine(cp.x(), (self.height() / 2) + (cS.height() / 2), cp.x(), self.height())
+                qp.drawLine(QLineF(cp.x(), 0, cp.x(), (self.height() / 2) - (cS.height() / 2)))
+                qp.drawLine(QLineF(cp.x(), (self.height() / 2) + (cS.height() / 2), cp.x(), self.height()))
                 qp.setPen(QPen(Qt.NoPen))
                 # Curseur en deça de la fenêtre
                 if cp.x() - cS.width() / 2 < 1:
@@ -400,38 +1338,169 @@ class Ruler(QMainWindow):
                     x= cp.x() - cS.width() / 2
                 # Mode zoom
                 if not self.zoom:
-                    qp.drawRect(x - 2, (self.height() / 2 - cS.height() / 2) - 2, cS.width() + 4, cS.height() + 4)
+                    qp.drawRect(QRectF(x - 2, (self.height() / 2 - cS.height() / 2) - 2, cS.width() + 4, cS.height() + 4))
                 qp.setPen(QPen(self.colors[2][0][1], 1, Qt.SolidLine))
-                qp.drawText(x, self.height() / 2 + cS.height() / 2, str(cp.x()))
+                self.drawLabel(qp, x, self.height() / 2 + cS.height() / 2, str(cp.x()))
+
+    def drawMarks(self, qp, rect):
+        # Seules les marques de la zone à redessiner sont dessinées, avec
+        # leurs voisines pour les distances entre elles. / Only the marks of
+        # the area to repaint are drawn, with their neighbours for the
+        # distances between them.
+        if not self.marks:
+            return
+        origin = self.mapToParent(QPoint(0, 0))
+        if self.oH:
+            first, last = self.marks.span(origin.y() + rect.top(), origin.y() + rect.bottom())
+        else:
+            first, last = self.marks.span(origin.x() + rect.left(), origin.x() + rect.right())
+        first, last = max(0, first - 1), min(len(self.marks), last + 1)
+        model = self.rulerModel()
+        unit = "" if not self.unitIndex else " " + self.unitDefs[self.unitIndex][0][1]
+        previous = None
+        for i in range(first, last):
+            cp = QPoint(*self.marks.point(i)) - origin
+            self.drawCursorPosition(qp, cp)
+            distance, cumulative = self.marks.distances(i, model)
+            # Cumul au quart de la règle, distance avec la précédente aux
+            # trois quarts. / Cumulative distance at a quarter of the ruler,
+            # distance to the previous one at three quarters.
+            if i:
+                self.drawMarkLabel(qp, cp.y() if self.oH else cp.x(), 0.25, model.format(cumulative) + unit)
+            if previous is not None:
+                self.drawMarkLabel(qp, ((previous.y() + cp.y()) if self.oH else (previous.x() + cp.x())) / 2, 0.75, model.format(distance) + unit)
+            previous = cp
+
+    def drawMarkLabel(self, qp, along, across, text):
+        # Texte centré en along sur l'axe, à la fraction across de
+        # l'épaisseur, sur un fond. / Text centred on along on the axis, at the
+        # fraction across of the thickness, on a background.
+        qp.setPen(QPen(Qt.NoPen))
+        qp.setBrush(self.colors[1][0][1])
+        cS = self.labelRect(qp, text)
+        if self.oH:
+            x, y = self.width() * across - cS.width() / 2, along + cS.height() / 2
+        else:
+            x, y = along - cS.width() / 2, self.height() * across + cS.height() / 2
+        qp.drawRect(QRectF(x - 2, y - cS.height() - 2, cS.width() + 4, cS.height() + 4))
+        qp.setPen(QPen(self.colors[2][0][1], 1, Qt.SolidLine))
+        self.drawLabel(qp, x, y, text)
+
+    def addMark(self, point):
+        # point en coordonnées globales. / point in global coordinates.
+        index = self.marks.add(point.x(), point.y())
+        self.exportMark("add", index)
+        self.invalidate()
+
+    def removeMark(self, index):
+        self.exportMark("remove", index)
+        self.marks.remove(index)
+        self.invalidate()
+
+    def clearMarks(self):
+        self.marks.clear()
+        self.exportMark("clear")
+        self.invalidate()
+
+    def exportMark(self, action, index=None):
+        # Une écriture ratée arrête l'export et prévient l'utilisateur. / A
+        # failed write stops the export and warns the user.
+        if self.markExport is None:
+            return
+        try:
+            self.markExport.write(action, self.marks, index, self.rulerModel(), self.unitDefs[self.unitIndex][0][1])
+        except OSError as error:
+            self.markExport.close()
+            self.markExport = None
+            QMessageBox.warning(self, gettext("Export Marks"), str(error))
+
+    def exportMarks(self):
+        # Le fichier choisi reçoit les marques actuelles puis chaque
+        # changement. / The chosen file receives the current marks then every
+        # change.
+        filename = QFileDialog.getSaveFileName(self, gettext("Export Marks"), self.settings.value("Marks/Export", ""), "CSV (*.csv);;JSON Lines (*.jsonl);;JSON (*.json)")[0]
+        if not filename:
+            return
+        if self.markExport is not None:
+            self.markExport.close()
+            self.markExport = None
+        try:
+            self.markExport = MarkExport(filename)
+        except (OSError, ValueError) as error:
+            QMessageBox.warning(self, gettext("Export Marks"), str(error))
+            return
+        for index in range(len(self.marks)):
+            self.exportMark("add", index)
 
     def openContextMenu(self, point):
-        self.Menu(self).exec_(self.mapToGlobal(point))
+        if self.contextMenu is None:
+            self.contextMenu = self.Menu(self)
+        self.contextMenu.exec_(self.mapToGlobal(point))
+
+    def showAbout(self):
+        if self.aboutDialog is None:
+            self.aboutDialog = self.Menu.AboutDialog(self)
+        self.aboutDialog.exec_()
 
     def changeMode(self, zoom):
         self.zoom = zoom
         self.pix = None
-        self.mark.clear()
-        self.repaint()
+        self.updateLiveZoom()
+        self.invalidate()
+
+    def changeZoomFollow(self, checked):
+        self.zoomFollow = checked
+        self.updateLiveZoom()
+        self.invalidate()
+
+    def changeZoomGrid(self, checked):
+        self.zoomGrid = checked
+        self.updateLiveZoom()
+        self.invalidate()
+
+    def changeLiveZoom(self, checked):
+        self.liveZoom = checked
+        self.pix = None
+        self.updateLiveZoom()
+        self.invalidate()
+
+    def changeSnap(self, checked):
+        self.snap = checked
+        self.cursorRect = QRect()
+        if checked:
+            self.saveBackground()
+        self.invalidate()
 
     def changeRulerSize(self, scale):
         self.rulerSize = scale
-        self.setFixedSize(self.sX * (scale + 1), self.sY * (scale + 1))
+        self.cursorRect = QRect()
+        # Même forme que changeOrientation. / Same shape as changeOrientation.
+        self.setFixedSize(self.sX * (scale + 1) if not self.oH else self.sY, self.sY if not self.oH else self.sX * (scale + 1))
+        self.updateScaleLayer()
+        self.invalidate()
 
     def changeUnitMeasure(self, unitIndex):
         self.unitIndex = unitIndex
-        self.repaint()
+        self.updateScaleLayer()
+        self.invalidate()
 
     def changeRulerColor(self, color):
         if color == len(self.colors) - 1:
             self.colors= deepcopy(self.defaultColors)
+            self.labels.clear()
+            self.updateScaleLayer()
+            self.invalidate()
         else:
             co= QColorDialog.getColor(self.colors[color][0][1], self)
             if co.isValid():
                 self.colors[color][0][1]= co
-                self.repaint()
+                self.labels.clear()
+                self.updateScaleLayer()
+                self.invalidate()
 
     def changeOrientation(self, orientation):
-        self.mark.clear()
+        self.marks.setAxis(orientation)
+        self.cursorRect = QRect()
         self.setFixedSize(self.sX * (self.rulerSize + 1) if not orientation else self.sY, self.sY if not orientation else self.sX * (self.rulerSize + 1))
         self.oH, geometry= orientation, self.frameGeometry()
         if geometry.top() < 0:
@@ -440,27 +1509,97 @@ class Ruler(QMainWindow):
         if geometry.left() < 0:
             geometry.moveLeft(0)
             self.move(geometry.topLeft())
-        self.repaint()
+        self.updateScaleLayer()
+        self.invalidate()
 
     def pollCursor(self):
-        if QCursor.pos() != self.cursor:
-            self.cursor= QCursor.pos()
-            self.cursorMove.emit(QCursor.pos())
+        if not self.replaying:
+            self.cursorPolled(QCursor.pos(), time())
+
+    def cursorPolled(self, pos, now):
+        # Séparé de pollCursor pour rejouer une trace. / Split from pollCursor
+        # to replay a trace.
+        if pos != self.polledCursor:
+            if self.recorder is not None:
+                self.recorder.write(CURSOR, pos.x(), pos.y())
+            self.polledCursor, self.cursorSince = pos, now
+            self.cursor= pos
+            self.cursorMove.emit(pos)
+        self.schedulePoll(pos, now)
+
+    def startRecording(self, filename):
+        # L'état de la règle est écrit en tête pour la rejouer à l'identique.
+        # / The ruler state is written first to replay it identically.
+        self.recorder = TraceWriter(filename, self.unitIndex, self.oH, self.rulerSize, self.zoom, self.pos().x(), self.pos().y())
+
+    def schedulePoll(self, pos, now):
+        # Rapide si le curseur bouge près de la zone mesurée, lent sinon. /
+        # Fast if the cursor moves near the measured span, slow otherwise.
+        geometry = self.geometry()
+        if self.oH:
+            near = geometry.top() - self.pollMargin <= pos.y() <= geometry.bottom() + self.pollMargin
+        else:
+            near = geometry.left() - self.pollMargin <= pos.x() <= geometry.right() + self.pollMargin
+        interval = self.pollFast if near and now - self.cursorSince < self.pollIdle else self.pollSlow
+        if self.mouseTimer.interval() != interval:
+            self.mouseTimer.setInterval(interval)
 
     def handleCursorMove(self, pos):
         if (not self.oH and pos.x() >= self.geometry().left() and pos.x() <= self.geometry().right()) or (self.oH and pos.y() >= self.geometry().top() and pos.y() <= self.geometry().bottom()):
-            self.repaint()
+            self.invalidateCursor()
         else:
             self.cursor= None
+            self.invalidateCursor()
+        if self.zoom and self.zoomFollow:
+            if self.liveZoom:
+                self.updateLiveZoom()
+            elif self.zoomFrameKey is not None and self.zoomOrigin(self.mapFromParent(self.cursor) if self.cursor is not None else None)[0] != QPoint(*self.zoomFrameKey[2:4]):
+                self.invalidate()
+
+    def captureScreen(self, rect):
+        # Importé à la première capture : ctypes et subprocess ne sont pas
+        # chargés au démarrage. / Imported on the first capture: ctypes and
+        # subprocess are not loaded at startup.
+        from capture import CaptureError, QScreenCapture, captureBackend
+        if self.capture is None:
+            self.capture = captureBackend(self.captureName, self.ps, app.desktop().winId())
+        try:
+            return self.capture.grab(rect)
+        except CaptureError:
+            # Repli sur QScreen jusqu'au prochain changement d'écran. / Fall
+            # back to QScreen until the next screen change.
+            self.capture.close()
+            self.capture = QScreenCapture(self.ps, app.desktop().winId())
+            return self.capture.grab(rect)
 
     def saveBackground(self):
-        if self.zoom:
+        # Le zoom direct a ses propres captures ; l'accroche aux bords a
+        # besoin de la zone sous la règle. / Live zoom has its own captures;
+        # snapping to edges needs the area under the ruler.
+        if (self.zoom and not self.liveZoom) or self.snap:
+            started = perf_counter()
             self.hide()
-            self.pix = self.ps.grabWindow(app.desktop().winId(), self.x(), self.y(), self.width(), self.height())
+            # Copie : l'image du backend peut être réutilisée. / Copy: the
+            # backend image may be reused.
+            self.pix = self.captureScreen(self.geometry()).copy()
             self.show()
+            self.failedCapture = QRect(self.geometry()) if self.pix.isNull() or self.pix.size() / self.pix.devicePixelRatio() != self.size() else None
+            if self.profiler is not None:
+                self.profiler.captured(started)
 
 if __name__ == "__main__":
+    # Rendu par lots sans fenêtre. / Batch rendering without a window.
+    if argv[1:2] == ["--batch"]:
+        from batch import main
+        exit(main(argv[2:]))
     app= QApplication([])
-    ui= Ruler()
+    startupMark("QApplication")
+    ui= Ruler("hud" if "--hud" in argv else "1" if "--profile" in argv else environ.get(PROFILE_ENV), "--startup-profile" in argv)
+    startupMark("Ruler")
+    # Trace des entrées à rejouer avec benchmarks/replay.py. / Input trace to
+    # replay with benchmarks/replay.py.
+    if "--record" in argv[:-1]:
+        ui.startRecording(argv[argv.index("--record") + 1])
     ui.show()
+    startupMark("show")
     exit(app.exec_())
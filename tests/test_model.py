@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+# Graduations de tickLayout à DPI non entiers, index des bords et export des
+# marques. / Ticks of tickLayout at non-integer DPI, edge index and mark
+# export.
+
+from os import path
+from tempfile import mkdtemp
+import json
+import sys
+import unittest
+
+sys.path.insert(0, path.dirname(path.dirname(path.realpath(__file__))))
+
+import model
+
+DPIS = [96, 110.5, 157.3]
+LENGTHS = [600, 2400]
+
+class TickLayoutTest(unittest.TestCase):
+    def layouts(self):
+        for unitIndex in range(len(model.UNIT_NAMES)):
+            for dpi in DPIS:
+                for length in LENGTHS:
+                    yield unitIndex, dpi, length, model.RulerModel(unitIndex, 0, dpi, dpi, length)
+
+    def testNoDuplicateOrMissingTick(self):
+        for unitIndex, dpi, length, ruler in self.layouts():
+            with self.subTest(unit=model.UNIT_NAMES[unitIndex], dpi=dpi, length=length):
+                units, mid, minor = model.UNIT_TICKS[unitIndex]
+                positions = [int(i) for layout in ruler.ticks() for i in layout[0]]
+                self.assertEqual(len(positions), len(set(positions)))
+                # Toutes les subdivisions de la plus fine classe, arrondies. /
+                # Every subdivision of the finest class, rounded.
+                finest = max(1, mid, minor)
+                spacing = ruler.scale() * units / finest
+                expected = {int(j * spacing + 0.5) for j in range(int(length / spacing) + 2)}
+                self.assertEqual(set(positions), {i for i in expected if 2 <= i < length})
+
+    def testLabelsOnMajorTicks(self):
+        for unitIndex, dpi, length, ruler in self.layouts():
+            with self.subTest(unit=model.UNIT_NAMES[unitIndex], dpi=dpi, length=length):
+                positions, size, labels = ruler.ticks()[0]
+                self.assertEqual(size, model.TICK_LENGTHS[0])
+                self.assertEqual(len(positions), len(labels))
+                for position, label in zip(positions, labels):
+                    self.assertEqual(int(position), int(label * ruler.scale() + 0.5))
+
+    @unittest.skipIf(model.loadNumpy() is None, "NumPy is not installed")
+    def testNumpyMatchesList(self):
+        threshold = model.NUMPY_MIN_TICKS
+        try:
+            for unitIndex in range(len(model.UNIT_NAMES)):
+                for dpi in DPIS:
+                    units, mid, minor = model.UNIT_TICKS[unitIndex]
+                    step = model.unitScales(dpi, dpi)[unitIndex][0] * units
+                    # Assez long pour dépasser NUMPY_MIN_TICKS. / Long enough
+                    # to go past NUMPY_MIN_TICKS.
+                    span = int(step * threshold) + 1
+                    with self.subTest(unit=model.UNIT_NAMES[unitIndex], dpi=dpi):
+                        model.NUMPY_MIN_TICKS = 1 << 62
+                        listed = model.tickLayout(span, step, mid, minor, units)
+                        model.NUMPY_MIN_TICKS = threshold
+                        vectorized = model.tickLayout(span, step, mid, minor, units)
+                        self.assertEqual(len(listed), len(vectorized))
+                        for (positions, size, labels), (vPositions, vSize, vLabels) in zip(listed, vectorized):
+                            self.assertEqual(list(positions), [int(i) for i in vPositions])
+                            self.assertEqual(size, vSize)
+                            self.assertEqual(labels, None if vLabels is None else [int(i) for i in vLabels])
+        finally:
+            model.NUMPY_MIN_TICKS = threshold
+
+def stripes(bounds, length, thickness, oH, padding=8):
+    # Image RGB32 en bandes grises le long de l'axe, lignes complétées de
+    # padding octets : [(début, gris)]. / RGB32 image striped in grey along
+    # the axis, rows padded with padding bytes: [(start, grey)].
+    width, height = (thickness, length) if oH else (length, thickness)
+    stride = width * 4 + padding
+    buffer = bytearray(b"\x7f" * stride * height)
+    for y in range(height):
+        for x in range(width):
+            along = y if oH else x
+            grey = [value for start, value in bounds if start <= along][-1]
+            buffer[y * stride + x * 4:y * stride + x * 4 + 4] = bytes((grey, grey, grey, 255))
+    return buffer, width, height, stride
+
+@unittest.skipIf(model.loadNumpy() is None, "NumPy is not installed")
+class EdgeIndexTest(unittest.TestCase):
+    def testBothOrientations(self):
+        for oH in range(2):
+            with self.subTest(oH=oH):
+                edges = model.edgeIndex(*stripes([(0, 0), (40, 255), (100, 128)], 160, 12, oH), oH=oH)
+                self.assertEqual(list(edges.positions), [40, 100])
+                self.assertEqual(list(edges.strengths), [255, 127])
+
+    def testDevicePixelRatio(self):
+        # Positions en pixels logiques. / Positions in logical pixels.
+        edges = model.edgeIndex(*stripes([(0, 0), (40, 255), (100, 128)], 160, 12, 0), ratio=2)
+        self.assertEqual(list(edges.positions), [20, 50])
+
+    def testWeakEdgesIgnored(self):
+        edges = model.edgeIndex(*stripes([(0, 100), (50, 100 + model.EDGE_MIN_STRENGTH - 1)], 100, 4, 0))
+        self.assertEqual(len(edges), 0)
+
+    def testLimitKeepsStrongest(self):
+        # Marches de force croissante tous les 10 pixels. / Steps of
+        # increasing strength every 10 pixels.
+        bounds, grey = [(0, 0)], 0
+        for i in range(1, 8):
+            grey += 25 + i
+            bounds.append((i * 10, grey))
+        edges = model.edgeIndex(*stripes(bounds, 80, 4, 0), limit=3)
+        self.assertEqual(list(edges.positions), [50, 60, 70])
+        self.assertEqual(len(model.edgeIndex(*stripes(bounds, 80, 4, 0))), 7)
+
+    def testSnap(self):
+        edges = model.EdgeIndex([10, 14, 30], [100, 30, 100])
+        # Le plus fort à portée, même plus loin. / The strongest in reach,
+        # even further.
+        self.assertEqual(edges.snap(13, 5), 10)
+        self.assertEqual(edges.snap(15, 1), 14)
+        # Hors de portée. / Out of reach.
+        self.assertEqual(edges.snap(22, 5), 22)
+        # Égalité de force : le plus proche. / Tie on strength: the nearest.
+        self.assertEqual(edges.snap(21, 12), 30)
+        self.assertEqual(edges.snap(19, 12), 10)
+        self.assertEqual(model.EdgeIndex().snap(5, 8), 5)
+
+class MarkExportTest(unittest.TestCase):
+    def testJsonArrayStaysValid(self):
+        filename = path.join(mkdtemp(), "marks.json")
+        session = model.MarkSession()
+        for x in (300, 100, 200):
+            session.add(x, 5)
+        export = model.MarkExport(filename)
+        with open(filename) as data:
+            self.assertEqual(json.load(data), [])
+        export.write("add", session, 1, model.RulerModel())
+        export.write("clear")
+        export.close()
+        # Reprise du même fichier. / The same file is continued.
+        export = model.MarkExport(filename)
+        export.write("add", session, 2, model.RulerModel(4), "cm")
+        export.close()
+        with open(filename) as data:
+            rows = json.load(data)
+        self.assertEqual([row["action"] for row in rows], ["add", "clear", "add"])
+        self.assertEqual((rows[0]["position"], rows[0]["distance"]), (200, "100"))
+        self.assertEqual(rows[2]["unit"], "cm")
+
+    def testRejectsOtherJson(self):
+        filename = path.join(mkdtemp(), "other.json")
+        with open(filename, "w") as data:
+            data.write("{}")
+        self.assertRaises(ValueError, model.MarkExport, filename)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+# Déplacement de la règle entre deux écrans de DPI différents, sur la
+# plateforme offscreen. / Moving the ruler between two screens with different
+# DPI, on the offscreen platform.
+
+from os import environ, path
+from tempfile import mkdtemp
+import sys
+import unittest
+
+environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, path.dirname(path.dirname(path.realpath(__file__))))
+
+try:
+    from PyQt5.QtCore import QObject, QPoint, QRect, QSettings, pyqtSignal
+    from PyQt5.QtGui import QImage
+    from PyQt5.QtWidgets import QApplication
+except ImportError:
+    raise unittest.SkipTest("PyQt5 is not installed")
+
+class VirtualScreen(QObject):
+    # Ce que Ruler lit d'un QScreen ; la plateforme offscreen de Qt 5 n'a
+    # qu'un écran. / What Ruler reads from a QScreen; the Qt 5 offscreen
+    # platform has a single screen.
+    logicalDotsPerInchChanged = pyqtSignal(float)
+    geometryChanged = pyqtSignal(QRect)
+    virtualGeometryChanged = pyqtSignal(QRect)
+
+    def __init__(self, name, dpi, geometry):
+        super().__init__()
+        self.screenName, self.dpi, self.rect = name, dpi, geometry
+
+    def name(self):
+        return self.screenName
+
+    def logicalDotsPerInchX(self):
+        return self.dpi
+
+    def logicalDotsPerInchY(self):
+        return self.dpi
+
+    def devicePixelRatio(self):
+        return 1.0
+
+    def geometry(self):
+        return self.rect
+
+    def virtualGeometry(self):
+        return QRect(0, 0, 3840, 1080)
+
+class ScreenChangeTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        QSettings.setPath(QSettings.NativeFormat, QSettings.UserScope, mkdtemp())
+        cls.app = QApplication.instance() or QApplication([])
+        import screenrulerzoom
+        screenrulerzoom.app = cls.app
+        cls.ruler = screenrulerzoom.Ruler()
+        cls.ruler.changeOrientation(0)
+        cls.ruler.show()
+        cls.app.processEvents()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.ruler.liveWorker.stop()
+        cls.ruler.hide()
+
+    def paint(self):
+        image = QImage(self.ruler.size(), QImage.Format_ARGB32_Premultiplied)
+        self.ruler.render(image)
+        return self.ruler.scaleLayer
+
+    def testMoveBetweenScreens(self):
+        left = VirtualScreen("left", 96, QRect(0, 0, 1920, 1080))
+        right = VirtualScreen("right", 144, QRect(1920, 0, 1920, 1080))
+        self.ruler.changeScreen(left)
+        leftLayer = self.paint()
+        self.assertEqual((self.ruler.dpiX, self.ruler.dpiY), (96, 96))
+        self.assertIn(96, self.ruler.scaleLayerKey())
+        misses = self.ruler.labels.misses
+        # Autre DPI : textes et calque reconstruits. / Other DPI: texts and
+        # layer rebuilt.
+        self.ruler.changeScreen(right)
+        self.assertFalse(self.ruler.labels.entries)
+        rightLayer = self.paint()
+        self.assertEqual((self.ruler.dpiX, self.ruler.dpiY), (144, 144))
+        self.assertIsNot(rightLayer, leftLayer)
+        self.assertIn(144, self.ruler.scaleLayerKey())
+        self.assertGreater(self.ruler.labels.misses, misses)
+        self.assertEqual(self.ruler.unitDefs[4][1][0], 144 / 2.54)
+        # Retour : le calque de l'écran est repris du cache. / Back: the
+        # layer of the screen is taken from the cache.
+        self.ruler.changeScreen(left)
+        self.assertIs(self.paint(), leftLayer)
+
+    def testScreenDpiChange(self):
+        screen = VirtualScreen("changing", 96, QRect(0, 0, 1920, 1080))
+        self.ruler.changeScreen(screen)
+        self.paint()
+        screen.dpi = 120
+        screen.logicalDotsPerInchChanged.emit(120.0)
+        self.paint()
+        self.assertEqual(self.ruler.dpiX, 120)
+        self.assertIn(120, self.ruler.scaleLayerKey())
+
+    def testVirtualGeometryChange(self):
+        # Les flèches sont bornées par le bureau en cache. / Arrow keys are
+        # bounded by the cached desktop.
+        screen = VirtualScreen("narrow", 96, QRect(0, 0, 1920, 1080))
+        self.ruler.changeScreen(screen)
+        self.ruler.move(0, 0)
+        screen.virtualGeometry = lambda: QRect(0, 0, 1920, 1080)
+        screen.virtualGeometryChanged.emit(QRect(0, 0, 1920, 1080))
+        self.ruler.nudge = QPoint(5000, 0)
+        self.ruler.applyNudge()
+        self.assertEqual(self.ruler.frameGeometry().right(), 1919)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+# Accroche aux bords quand la capture échoue, sur la plateforme offscreen. /
+# Snapping to edges when the capture fails, on the offscreen platform.
+
+from os import environ, path
+from tempfile import mkdtemp
+from time import perf_counter, sleep, time
+import sys
+import unittest
+
+environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, path.dirname(path.dirname(path.realpath(__file__))))
+
+try:
+    from PyQt5.QtCore import QPoint, QSettings
+    from PyQt5.QtGui import QImage
+    from PyQt5.QtWidgets import QApplication
+except ImportError:
+    raise unittest.SkipTest("PyQt5 is not installed")
+
+class FailedCaptureTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        QSettings.setPath(QSettings.NativeFormat, QSettings.UserScope, mkdtemp())
+        cls.app = QApplication.instance() or QApplication([])
+        import screenrulerzoom
+        screenrulerzoom.app = cls.app
+        cls.ruler = screenrulerzoom.Ruler()
+        cls.ruler.changeOrientation(0)
+        cls.ruler.show()
+        cls.app.processEvents()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.ruler.liveWorker.stop()
+        cls.ruler.hide()
+
+    def sweep(self, seconds):
+        # Curseur promené sur la règle. / Cursor swept over the ruler.
+        end = perf_counter() + seconds
+        x = 0
+        while perf_counter() < end:
+            x = (x + 7) % self.ruler.width()
+            self.ruler.cursorPolled(self.ruler.mapToGlobal(QPoint(x, 10)), time())
+            self.app.processEvents()
+            sleep(0.005)
+
+    def testNoRetryUntilMoved(self):
+        # QScreen.grabWindow renvoie une image nulle sous Wayland. /
+        # QScreen.grabWindow returns a null image on Wayland.
+        captures = []
+        self.ruler.captureScreen = lambda rect: captures.append(rect) or QImage()
+        self.ruler.pix = None
+        self.ruler.changeSnap(True)
+        self.sweep(1)
+        self.assertEqual(len(captures), 1)
+        self.ruler.move(self.ruler.pos() + QPoint(10, 0))
+        self.sweep(0.5)
+        self.assertEqual(len(captures), 2)
+
+if __name__ == "__main__":
+    unittest.main()